@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import numpy as np
+import pymunk
+import random
+import os
+import sys
+import json
+import time
+import platform
+import resource
+import subprocess
+import tracemalloc
+import argparse
+
+from simulator import CovidSim
+from pathfinding import Pathfinder
+
+from typing import Tuple, List, Optional, Union, Dict
+
+
+# default workload of the benchmark suite (all benchmarks use fixed seeds, so the results are comparable between builds)
+DEFAULT_AGENT_COUNTS = (500, 2_000, 10_000, 50_000)
+DEFAULT_SEED = 1
+
+
+def _timed(function, *args, **kwargs) -> Tuple[float, object]:
+    """Calls the function and returns the elapsed wall-clock time in seconds and the function's result."""
+    start_time = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start_time, result
+
+
+def _max_rss_mb() -> float:
+    """Returns the peak resident memory of this process in MB (ru_maxrss is in KB on Linux and in bytes on macOS)."""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / 1024**2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def get_environment() -> Dict:
+    """Returns a description of the host and the build, so that the results of different runs can be compared."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pymunk": pymunk.version,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def benchmark_steps(
+    pathfinder: Pathfinder,
+    n_people: int,
+    n_steps: int,
+    warmup_steps: int = 10,
+    seed: int = DEFAULT_SEED,
+) -> Dict:
+    """
+    Measures the headless steps per second of a CovidSim run with n_people agents.
+    The setup of the run (creating the world and the population) and a few warmup steps are timed separately,
+    the steps are then timed by resuming the run.
+    """
+    sim = CovidSim(n_people, avg_incubation_time=100, avg_infectious_time=200, headless=True)
+    sim.pf = pathfinder
+
+    setup_time, _ = _timed(sim.run, seed=seed, speedup_factor=5, max_timestep=warmup_steps)
+    run_time, _ = _timed(sim.resume, max_timestep=warmup_steps + n_steps)
+    return {
+        "n_people": n_people,
+        "n_steps": n_steps,
+        "setup_s": setup_time,
+        "run_s": run_time,
+        "steps_per_s": n_steps / run_time,
+        "agent_steps_per_s": n_people * n_steps / run_time,
+    }
+
+
+def benchmark_create_heatmap(pathfinder: Pathfinder, n_targets: int = 3) -> Dict:
+    """
+    Measures the time for computing the heatmap (Pathfinder.create_heatmap) of each of the first n_targets targets.
+    """
+    times = [
+        _timed(pathfinder.create_heatmap, tuple(target))[0]
+        for target in pathfinder.targets[:n_targets]
+    ]
+    return {
+        "n_targets": len(times),
+        "per_target_s": times,
+        "mean_s": float(np.mean(times)),
+        "min_s": float(np.min(times)),
+    }
+
+
+def benchmark_load_heatmap_tensor(pathfinder: Pathfinder) -> Dict:
+    """
+    Measures the time and the peak (python-allocated) memory for loading the heatmap tensor from the cache,
+    and the time for reading all of its pages (the tensor is memory-mapped, so loading itself reads nothing).
+    """
+    tracemalloc.start()
+    load_time, loaded = _timed(pathfinder.load_heatmap_tensor)
+    _, load_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    read_time, _ = _timed(
+        lambda: (int(pathfinder.heatmap_tensor.max()), int(pathfinder.direction_field.max()))
+    )
+    return {
+        "loaded": loaded,
+        "load_s": load_time,
+        "load_peak_traced_mb": load_peak / 1024**2,
+        "read_all_pages_s": read_time,
+        "heatmap_tensor_mb": pathfinder.heatmap_tensor.nbytes / 1024**2,
+        "direction_field_mb": pathfinder.direction_field.nbytes / 1024**2,
+        "max_rss_mb": _max_rss_mb(),
+    }
+
+
+def benchmark_get_direction(
+    pathfinder: Pathfinder, n_queries: int = 100_000, seed: int = DEFAULT_SEED
+) -> Dict:
+    """
+    Measures the throughput of single get_direction calls and of batched get_directions lookups
+    for random positions and targets.
+    """
+    rng = np.random.default_rng(seed)
+    positions = rng.integers(0, pathfinder.world_array.shape[0], size=(n_queries, 2))
+    targets = rng.integers(0, len(pathfinder.targets), size=n_queries)
+
+    n_single = n_queries // 10
+    single_time, _ = _timed(
+        lambda: [
+            pathfinder.get_direction(tuple(position), target)
+            for position, target in zip(positions[:n_single], targets[:n_single])
+        ]
+    )
+    batched_time, _ = _timed(pathfinder.get_directions, positions, targets)
+    return {
+        "n_single_calls": n_single,
+        "single_calls_per_s": n_single / single_time,
+        "n_batched_queries": n_queries,
+        "batched_queries_per_s": n_queries / batched_time,
+    }
+
+
+def benchmark_collision_begin(
+    pathfinder: Pathfinder,
+    n_people: int = 2_000,
+    n_steps: int = 200,
+    seed: int = DEFAULT_SEED,
+) -> Dict:
+    """
+    Measures the cost of the collision_begin callback by timing every call during a headless run
+    (the timing overhead of perf_counter is measured and subtracted).
+    """
+    sim = CovidSim(n_people, avg_incubation_time=100, avg_infectious_time=200, headless=True)
+    sim.pf = pathfinder
+    sim.run(seed=seed, speedup_factor=5, max_timestep=1)
+
+    # wrap the callback of the running simulation
+    n_calls = 0
+    callback_time = 0.0
+    collision_begin = sim.collision_begin
+
+    def timed_collision_begin(arbiter, space, data):
+        nonlocal n_calls, callback_time
+        start_time = time.perf_counter()
+        result = collision_begin(arbiter, space, data)
+        callback_time += time.perf_counter() - start_time
+        n_calls += 1
+        return result
+
+    sim.handler.begin = timed_collision_begin
+    sim.resume(max_timestep=1 + n_steps)
+
+    # overhead of the two perf_counter calls
+    n_samples = 100_000
+    overhead_time, _ = _timed(
+        lambda: [time.perf_counter() - time.perf_counter() for _ in range(n_samples)]
+    )
+    overhead_per_call = overhead_time / n_samples
+
+    net_time = max(callback_time - n_calls * overhead_per_call, 0.0)
+    return {
+        "n_people": n_people,
+        "n_steps": n_steps,
+        "n_calls": n_calls,
+        "calls_per_step": n_calls / n_steps,
+        "total_s": net_time,
+        "us_per_call": 1e6 * net_time / max(n_calls, 1),
+    }
+
+
+def run_benchmarks(
+    agent_counts: Tuple[int, ...] = DEFAULT_AGENT_COUNTS,
+    n_steps: int = 100,
+    n_heatmap_targets: int = 3,
+    seed: int = DEFAULT_SEED,
+    output_path: Optional[str] = "benchmark_results.json",
+) -> Dict:
+    """
+    Runs all benchmarks and writes the results (and a description of the host) as JSON to output_path.
+    The heatmaps are taken from the heatmap cache (they are computed and cached if they don't exist yet).
+    """
+    random.seed(seed)
+    np.random.seed(seed)
+    pathfinder = Pathfinder(CovidSim(n_people=1, headless=True), use_precomputed_heatmaps=True)
+
+    results = {"environment": get_environment(), "seed": seed}
+    results["load_heatmap_tensor"] = benchmark_load_heatmap_tensor(pathfinder)
+    results["create_heatmap"] = benchmark_create_heatmap(pathfinder, n_heatmap_targets)
+    results["get_direction"] = benchmark_get_direction(pathfinder, seed=seed)
+    results["collision_begin"] = benchmark_collision_begin(pathfinder, seed=seed)
+    results["steps"] = []
+    for n_people in agent_counts:
+        results["steps"].append(benchmark_steps(pathfinder, n_people, n_steps, seed=seed))
+        print(
+            f"{n_people} agents: {results['steps'][-1]['steps_per_s']:.1f} steps/s"
+        )
+    results["max_rss_mb"] = _max_rss_mb()
+
+    if output_path is not None:
+        with open(output_path, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+        print(f"saved the benchmark results to '{output_path}'")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the hot paths of the simulator.")
+    parser.add_argument(
+        "--agents", type=int, nargs="+", default=list(DEFAULT_AGENT_COUNTS),
+        help="agent counts for the steps/s benchmark",
+    )
+    parser.add_argument("--steps", type=int, default=100, help="timed steps per agent count")
+    parser.add_argument(
+        "--heatmap-targets", type=int, default=3, help="number of targets for the create_heatmap benchmark"
+    )
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", default="benchmark_results.json", help="path of the JSON results")
+    args = parser.parse_args()
+
+    run_benchmarks(
+        agent_counts=tuple(args.agents),
+        n_steps=args.steps,
+        n_heatmap_targets=args.heatmap_targets,
+        seed=args.seed,
+        output_path=args.output,
+    )
@@ -0,0 +1,10 @@
+import pytest
+
+from simulator import CovidSim
+from pathfinding import Pathfinder
+
+
+@pytest.fixture(scope="session")
+def pathfinder() -> Pathfinder:
+    """A pathfinder for the default map (the heatmaps are computed once and then taken from the heatmap cache)."""
+    return Pathfinder(CovidSim(n_people=1, headless=True), use_precomputed_heatmaps=True)
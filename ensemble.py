@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import numpy as np
+import os
+
+from worker_pool import simulation_pool, get_worker_sim
+
+from itertools import repeat
+from typing import Tuple, List, Optional, Union, Dict
+
+
+def _run_seed(seed: int, run_kwargs: Dict) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Runs the worker's simulator with the given seed and returns the status counts with shape (steps, 4)
+    and the transmission events (see TRANSMISSION_DTYPE).
+    """
+    data = get_worker_sim().run(seed=seed, return_data=True, **run_kwargs)
+    return np.stack(data[:4], axis=1), data[4].copy()
+
+
+def run_ensemble(
+    sim_kwargs: Dict,
+    n_runs: int,
+    start_seed: int = 1,
+    n_workers: Optional[int] = None,
+    use_precomputed_heatmaps: bool = True,
+    **run_kwargs,
+) -> Tuple[np.ndarray, List[np.ndarray]]:
+    """
+    Runs an ensemble of n_runs headless simulations with the seeds start_seed, start_seed+1, ...
+    in parallel on a pool of n_workers processes (default: one per CPU core, at most n_runs).
+    sim_kwargs are passed to CovidSim and run_kwargs (e.g. speedup_factor, max_timestep) to CovidSim.run.
+    Returns the status counts of all runs as an array with shape (n_runs, steps, 4)
+    and a list with the transmission events of every run (structured arrays, see TRANSMISSION_DTYPE).
+    (When this is called from a script, the call has to be guarded by `if __name__ == "__main__":`.)
+    """
+    if n_workers is None:
+        n_workers = min(n_runs, os.cpu_count() or 1)
+
+    seeds = [start_seed + run_index for run_index in range(n_runs)]
+    with simulation_pool(sim_kwargs, n_workers, use_precomputed_heatmaps) as executor:
+        results = list(executor.map(_run_seed, seeds, repeat(run_kwargs)))
+
+    status_counts = np.stack([counts for counts, _ in results])
+    transmissions = [events for _, events in results]
+    return status_counts, transmissions
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import time
+
+from typing import Tuple, List, Optional, Union, Dict
+
+
+# version of the heatmap builder and the stored field formats
+# (increase it whenever the builder or the formats change, so that old cache entries aren't used anymore)
+HEATMAP_BUILDER_VERSION = 1
+
+
+class HeatmapCache:
+    """
+    A content-addressed cache for the precomputed pathfinding fields (heatmaps and direction fields).
+    Every entry is a directory that is named after a hash of the rasterized world array, the target list
+    and the builder version, so changing a wall or a target automatically results in a different entry.
+    Several map versions are kept side by side and the least recently used entries are evicted.
+    """
+
+    def __init__(self, cache_dir: str = "heatmaps", max_entries: int = 4) -> None:
+        """
+        Initializes the cache in the given directory, which holds at most max_entries map versions.
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def get_world_key(self, world_array: np.ndarray) -> str:
+        """Returns the hash of the world geometry (and the builder version)."""
+        world_hash = hashlib.sha256()
+        world_hash.update(f"v{HEATMAP_BUILDER_VERSION}:{world_array.shape}".encode())
+        world_hash.update(np.ascontiguousarray(world_array, dtype=np.uint8).tobytes())
+        return world_hash.hexdigest()[:16]
+
+    def get_key(self, world_array: np.ndarray, targets: List[Tuple[int, int]]) -> str:
+        """Returns the key of the cache entry for the given world geometry and target list."""
+        key_hash = hashlib.sha256()
+        key_hash.update(self.get_world_key(world_array).encode())
+        key_hash.update(json.dumps([list(target) for target in targets]).encode())
+        return key_hash.hexdigest()[:16]
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _read_meta(self, key: str) -> Optional[Dict]:
+        """Returns the metadata of a cache entry (or None if the entry doesn't exist)."""
+        meta_path = os.path.join(self._entry_dir(key), "meta.json")
+        if not os.path.isfile(meta_path):
+            return None
+        with open(meta_path) as meta_file:
+            return json.load(meta_file)
+
+    def _touch(self, key: str) -> None:
+        """Marks a cache entry as recently used."""
+        os.utime(os.path.join(self._entry_dir(key), "meta.json"))
+
+    def get_entries(self) -> List[str]:
+        """Returns the keys of all cache entries, sorted from the least to the most recently used."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for key in os.listdir(self.cache_dir):
+            meta_path = os.path.join(self._entry_dir(key), "meta.json")
+            if os.path.isfile(meta_path):
+                entries.append((os.path.getmtime(meta_path), key))
+        return [key for _, key in sorted(entries)]
+
+    def load(
+        self, key: str, mark_as_used: bool = True
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Returns read-only memory maps of the heatmap tensor and the direction field of a cache entry
+        (or None if there is no entry with the given key).
+        """
+        if self._read_meta(key) is None:
+            return None
+        if mark_as_used:
+            self._touch(key)
+        entry_dir = self._entry_dir(key)
+        heatmap_tensor = np.load(
+            os.path.join(entry_dir, "heatmap_tensor_u16.npy"), mmap_mode="r"
+        )
+        direction_field = np.load(
+            os.path.join(entry_dir, "direction_field.npy"), mmap_mode="r"
+        )
+        return heatmap_tensor, direction_field
+
+    def find_targets(
+        self, world_array: np.ndarray, targets: List[Tuple[int, int]]
+    ) -> Dict[Tuple[int, int], Tuple[np.ndarray, np.ndarray]]:
+        """
+        Searches all cache entries of the same world geometry for already computed targets.
+        Returns a dict that maps each found target to (memory-mapped) views of its heatmap and direction field.
+        """
+        world_key = self.get_world_key(world_array)
+        wanted_targets = {tuple(target) for target in targets}
+        found_targets = {}
+        for key in reversed(self.get_entries()):
+            meta = self._read_meta(key)
+            if meta is None or meta["world_key"] != world_key:
+                continue
+            heatmap_tensor, direction_field = self.load(key, mark_as_used=False)
+            for i, target in enumerate(meta["targets"]):
+                target = tuple(target)
+                if target in wanted_targets and target not in found_targets:
+                    found_targets[target] = (heatmap_tensor[i], direction_field[i])
+        return found_targets
+
+    def store(
+        self,
+        world_array: np.ndarray,
+        targets: List[Tuple[int, int]],
+        heatmap_tensor: np.ndarray,
+        direction_field: np.ndarray,
+        replace: bool = False,
+    ) -> str:
+        """
+        Stores the fields for the given world geometry and target list as a new cache entry,
+        evicts the least recently used entries and returns the key of the new entry.
+        If the entry already exists, it is kept (another process stored the same fields) unless replace is True,
+        which replaces it with the given fields (for forced rebuilds, e.g. of a stale or corrupt entry).
+        """
+        key = self.get_key(world_array, targets)
+        entry_dir = self._entry_dir(key)
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # write everything to a temporary directory first, so that other processes never see a half-written entry
+        tmp_dir = os.path.join(self.cache_dir, f".{key}.tmp-{os.getpid()}")
+        os.makedirs(tmp_dir, exist_ok=True)
+        np.save(os.path.join(tmp_dir, "heatmap_tensor_u16.npy"), heatmap_tensor)
+        np.save(os.path.join(tmp_dir, "direction_field.npy"), direction_field)
+        meta = {
+            "world_key": self.get_world_key(world_array),
+            "targets": [list(target) for target in targets],
+            "builder_version": HEATMAP_BUILDER_VERSION,
+            "shape": list(heatmap_tensor.shape),
+            "created": time.time(),
+        }
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as meta_file:
+            json.dump(meta, meta_file, indent=2)
+
+        if not os.path.isdir(entry_dir):
+            os.rename(tmp_dir, entry_dir)
+        elif replace:
+            # move the old entry aside first (a directory can only be replaced by a rename if it doesn't exist)
+            old_dir = os.path.join(self.cache_dir, f".{key}.old-{os.getpid()}")
+            os.rename(entry_dir, old_dir)
+            os.replace(tmp_dir, entry_dir)
+            shutil.rmtree(old_dir, ignore_errors=True)
+        else:
+            # another process stored the same entry in the meantime
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        print(f"saved heatmap_tensor with shape {heatmap_tensor.shape} as cache entry '{key}'")
+
+        self.evict(keep=key)
+        return key
+
+    def evict(self, keep: Optional[str] = None) -> None:
+        """
+        Removes the least recently used entries until at most max_entries entries are left
+        (the entry with the key 'keep' is never removed).
+        """
+        entries = [key for key in self.get_entries() if key != keep]
+        n_kept = 1 if keep is not None else 0
+        while entries and len(entries) + n_kept > self.max_entries:
+            key = entries.pop(0)
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            print(f"evicted heatmap cache entry '{key}'")
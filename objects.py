@@ -7,7 +7,7 @@ import skimage.measure as measure
 import random
 import os
 
-from typing import Tuple, List, Optional, Union
+from typing import Tuple, List, Optional, Union, Dict
 
 
 # constants
@@ -18,6 +18,23 @@ LIGHT_GREY = (70, 84, 105)
 YELLOW = (245, 203, 66)
 RED = (252, 3, 65)
 
+# status codes of the SEIR model (the code is also the index in the status counts)
+SUSCEPTIBLE = 0
+INFECTED = 1
+INFECTIOUS = 2
+REMOVED = 3
+STATUS_NAMES = ("susceptible", "infected", "infectious", "removed")
+STATUS_COLORS = (BLUE, YELLOW, RED, LIGHT_GREY)  # colors for drawing people (indexed by status code)
+
+# pymunk collision types (only collisions between people are handled in Python, see CovidSim.install_collision_handler)
+PERSON_COLLISION_TYPE = 1
+WALL_COLLISION_TYPE = 2
+TRAIN_COLLISION_TYPE = 3
+
+# hyperparameters for the movement of people
+VELOCITY_MULTIPLIER = 30
+VEL_UPDATE_RATE = 0.015  # how much of the new velocity (which follows the optimal path to the target building) gets injected
+
 
 class Person:
     """
@@ -30,16 +47,23 @@ class Person:
         pathfinder,
         init_min: int,
         init_max: int,
+        population,
+        index: int,
         collision_radius: int = 10,
     ) -> None:
         """
         Initialize a particle (person) object with a specific position, velocity, and target building.
         The person will follow the shortest path to its target building using the pathfinder.
+        The person's status, target building and timer are stored at the given index in the population's arrays.
         """
 
         # pathfinder for following the shortest path to a given goal (i.e. a target building)
         self.pf = pathfinder
 
+        # the population that stores this person's state
+        self.population = population
+        self.index = index
+
         # initialization attributes of a physical particle object (with a circular shape)
         self.init_min = init_min  # lower bound for init position
         self.init_max = init_max  # upper bound for init position
@@ -48,22 +72,16 @@ class Person:
         self.shape = pymunk.Circle(self.body, self.collision_radius)
         self.shape.density = 1
         self.shape.elasticity = 1
+        self.shape.collision_type = PERSON_COLLISION_TYPE
+        self.shape.agent_id = index  # the person's index in the population (resolved by the collision handler)
 
         # initial velocity (will be overwritten by the path to the target building)
         self.body.velocity = random.uniform(-20, 20), random.uniform(-20, 20)
 
-        # set the initial status to susceptible (=healthy)
-        self.status = "susceptible"
-
-        # set a slight bias towards going to the library and mensa
-        # mensa:            building with index 3
-        # library ('IKMZ'): building with index 27
-        self.weights = [1 / 35 if i not in [3, 27] else 1 / 10 for i in range(30)]
-
-        # pick a target building
+        # pick a target building (the initial status is susceptible)
         # note: we are picking the index of the building in the pf.targets list, not the number of the building
         # (the index might differ from the buildings number)
-        self.target_building = np.random.choice(range(30), p=self.weights)
+        self.target_building = self.population.sample_targets(1)[0]
 
         # set the initial position of the particle near the target to avoid large crowds in the center
         # (when everyone needs to get to the other side of the map at once, they form a huge crowd in the center and nobody gets through)
@@ -92,115 +110,42 @@ class Person:
         # add the person to the simulation
         world.add(self.body, self.shape)
 
-    def infect(self) -> None:
-        """
-        Set the person's status to infected and the density of the shape to 0.9
-        """
-        self.shape.density = 0.9
-        self.status = "infected"
-
-    def update_velocity(self, timestep: int):
-        """
-        Update the velocity of the person based on the person's current position and target building.
-        """
-        # hyperparameters
-        velocity_multiplier = 30
-        vel_update_rate = 0.015  # how much of the new velocity (which follows the optimal path to the target building) gets injected
-
-        # get the current discrete position
-        x, y = self.body.position
-        discrete_position = (int(x), int(y))
-
-        # get the optimal velocity to follow the path to the target (based on the current position)
-        x_velocity, y_velocity = self.pf.get_direction(
-            discrete_position, target_building=self.target_building
-        )
-
-        # scale the velocity by the velocity multiplier
-        x_velocity = velocity_multiplier * x_velocity
-        y_velocity = velocity_multiplier * y_velocity
-
-        # add some noise to the optimal velocity (e.g. for when it gets trapped somewhere and can't get out or to resolve running into other particles)
-        additive_x_noise = 4 * random.random() - 2  # [-2 to 2], mean: 0
-        additive_y_noise = 4 * random.random() - 2  # [-2 to 2], mean: 0
-
-        # calculate the new velocity
-        old_velocity = self.body.velocity
-        new_x_velocity = (
-            (1 - vel_update_rate) * old_velocity[0]
-            + vel_update_rate * x_velocity
-            + additive_x_noise
-        )
-        new_y_velocity = (
-            (1 - vel_update_rate) * old_velocity[1]
-            + vel_update_rate * y_velocity
-            + additive_y_noise
-        )
-
-        # update the velocity
-        self.body.velocity = (new_x_velocity, new_y_velocity)
-
-    def draw(self, screen: pg.Surface) -> None:
+    def __getstate__(self) -> Dict:
         """
-        Draw the person on the screen.
-        The persons color depends on the person's infection status.
+        Returns the state of the person for pickling a checkpoint (without the pathfinder, which is reattached on loading).
         """
-        x, y = self.body.position
-        discrete_position = (int(x), int(y))
-        if self.status == "infected":
-            color = YELLOW
-        elif self.status == "infectious":
-            color = RED
-        elif self.status == "removed":
-            color = LIGHT_GREY
-        else:
-            color = BLUE
-        pg.draw.circle(screen, color, discrete_position, self.collision_radius)
-
-    def update_target(self, timestep: int) -> None:
-        """
-        Updates the target building for the person.
-        """
-        if (timestep % self.time_until_next_target) > 0 and (
-            timestep % self.time_until_next_target
-        ) < 50:
-            # set a new random target building
-            self.target_building = np.random.choice(range(30), p=self.weights)
-
-            # set for how many timesteps the person will persue the new target building
-            self.time_until_next_target = np.random.randint(9_000, 72_000)
-
-    def update_infection_status(
-        self, avg_incubation_time: int, avg_infectious_time: int, timestep: int
-    ) -> None:
+        state = self.__dict__.copy()
+        state["pf"] = None
+        return state
+
+    @property
+    def status(self) -> str:
+        """The person's infection status (read from the population's status array)."""
+        return STATUS_NAMES[self.population.status[self.index]]
+
+    @property
+    def target_building(self) -> int:
+        """The index of the person's target building (stored in the population)."""
+        return self.population.target_building[self.index]
+
+    @target_building.setter
+    def target_building(self, value: int) -> None:
+        self.population.target_building[self.index] = value
+
+    @property
+    def time_until_next_target(self) -> int:
+        """For how many timesteps the person persues its current target building (stored in the population)."""
+        return self.population.time_until_next_target[self.index]
+
+    @time_until_next_target.setter
+    def time_until_next_target(self, value: int) -> None:
+        self.population.time_until_next_target[self.index] = value
+
+    def infect(self, timestep: int = 0) -> None:
         """
-        Updates the infection status of the person (pseudo-randomly).
+        Set the person's status to infected (at the given simulation timestep).
         """
-        incubation_rate = (
-            1 / avg_incubation_time
-        )  # probability that the status switches from infected to infectious (sampled each timestep)
-        removed_rate = (
-            1 / avg_infectious_time
-        )  # probability that the status switches from infectious to removed (sampled each timestep)
-
-        # status updates if the person is currently infected
-        if self.shape.density == 0.9:
-
-            # assure that the status is infected
-            self.status = "infected"
-
-            # change the status to infectious with a probability of incubation_rate
-            if np.random.random() <= incubation_rate:
-                self.status = "infectious"
-                self.shape.density = 0.8
-
-        # status updates if the person is currently infectious
-        elif self.shape.density == 0.8:
-
-            # change the status to removed with a probability of removed_rate
-            if np.random.random() <= removed_rate:
-                self.status = "removed"
-                self.shape.density = 0.7
+        self.population.infect(self.index, timestep)
 
 
 class Wall:
@@ -247,6 +192,7 @@ class Wall:
             self.body, start_pos, end_pos, radius=thickness
         )  # people might glitch through if not big enough
         self.shape.elasticity = 1
+        self.shape.collision_type = WALL_COLLISION_TYPE
         world.add(self.body, self.shape)
 
     def get_pixels(self, use_buffer_px: bool = True) -> List[Tuple[int, int]]:
@@ -349,6 +295,7 @@ class Train:
         # set the elasticity (bouncyness of other objects when they collide with the train)
         for segment in self.segments:
             segment.elasticity = 0.5
+            segment.collision_type = TRAIN_COLLISION_TYPE
 
         # set the initial position and velocity of the physical body
         self.body.position = x, y
@@ -418,13 +365,14 @@ class Train:
         self.door.unsafe_set_endpoints(a=(x_a, y_a), b=(x_b, y_b - 40))
         self.door_is_open = True
 
-    def draw(self, screen) -> None:
-        """Draws a train image on the screen (in the train's current position)."""
+    def draw(self, screen: pg.Surface, train_img: pg.Surface) -> pg.Rect:
+        """
+        Draws the preloaded train image (scaled to 20x80 pixels, see Renderer) on the screen
+        (in the train's current position) and returns the area that was drawn.
+        """
         # get the train's position
         x_float, y_float = self.body.position
         x, y = int(x_float), int(y_float)
 
-        # load and display the train image
-        train_img = pg.image.load("images/train_transparent.png")
-        train_img = pg.transform.scale(train_img, (20, 80))
-        screen.blit(train_img, (x + 67, y))
+        # display the train image
+        return screen.blit(train_img, (x + 67, y))
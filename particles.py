@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import numpy as np
+
+from spatial_hash import SpatialHashGrid
+
+from typing import Tuple, List, Optional, Union
+
+
+class ParticleEngine:
+    """
+    A lightweight physics engine for many equally sized circular particles that stores all positions and velocities
+    in numpy arrays (an alternative to simulating every person as a pymunk body).
+    Every timestep is a handful of vectorized operations:
+    -> contacts are found with a uniform spatial hash grid and resolved by an elastic exchange of the normal velocities
+       and a soft repulsion that pushes overlapping particles apart
+    -> walls are the non-zero cells of a rasterized world array (like the one of the Pathfinder), so a particle bounces
+       off a wall by reflecting the velocity component of the axis along which it would enter a wall cell
+    All contact pairs of a timestep are reported in bulk (self.contacts), together with the pairs that started
+    touching in this timestep (self.new_contacts, like the pymunk begin-callback).
+    """
+
+    def __init__(
+        self,
+        world_array: np.ndarray,
+        n_particles: int,
+        radius: float = 2,
+        elasticity: float = 1.0,
+        repulsion: float = 0.5,
+    ) -> None:
+        """
+        Initializes the engine for n_particles particles with the given radius.
+        world_array is indexed with [x, y] and non-zero cells are walls.
+        elasticity is the fraction of the velocity that is kept when a particle bounces off a wall
+        and repulsion is the fraction of the overlap of two particles that is resolved per timestep.
+        """
+        self.world_array = world_array
+        self.width, self.height = world_array.shape
+        self.n_particles = n_particles
+        self.radius = radius
+        self.elasticity = elasticity
+        self.repulsion = repulsion
+
+        # the state of all particles
+        self.positions = np.zeros((n_particles, 2))
+        self.velocities = np.zeros((n_particles, 2))
+
+        # the grid for the contact detection (particles touch if their centers are less than 2 radii apart)
+        self.grid = SpatialHashGrid(2 * radius, self.width, self.height)
+
+        # contact pairs (m, 2) of the last timestep and their keys (for finding the new contacts)
+        self.contacts = np.zeros((0, 2), dtype=np.int64)
+        self.new_contacts = np.zeros((0, 2), dtype=np.int64)
+        self.contact_keys = np.zeros(0, dtype=np.int64)
+
+    def find_contacts(self) -> np.ndarray:
+        """Returns all pairs of particles that touch (see SpatialHashGrid.query_pairs)."""
+        self.grid.build(self.positions)
+        return self.grid.query_pairs(self.positions, 2 * self.radius)
+
+    def resolve_contacts(self, contacts: np.ndarray) -> np.ndarray:
+        """
+        Exchanges the normal velocities of all approaching particle pairs (an elastic collision of equal masses)
+        and returns the displacements (n, 2) that push overlapping particles apart.
+        """
+        displacements = np.zeros_like(self.positions)
+        if len(contacts) == 0:
+            return displacements
+
+        first, second = contacts[:, 0], contacts[:, 1]
+        deltas = self.positions[second] - self.positions[first]
+        distances = np.sqrt(np.sum(deltas**2, axis=1))
+
+        # normals from the first to the second particle (particles on the same spot are pushed apart along the x-axis)
+        normals = np.zeros_like(deltas)
+        normals[:, 0] = 1
+        separated = distances > 0
+        normals[separated] = deltas[separated] / distances[separated, None]
+
+        # exchange the velocity components along the normals (only if the particles approach each other)
+        normal_velocities = np.sum(
+            (self.velocities[second] - self.velocities[first]) * normals, axis=1
+        )
+        impulses = np.minimum(normal_velocities, 0)[:, None] * normals
+
+        # push the particles apart (each particle is moved by half of the resolved overlap)
+        overlaps = np.maximum(2 * self.radius - distances, 0)
+        pushes = (0.5 * self.repulsion * overlaps)[:, None] * normals
+
+        # all contacts are resolved at once, so the changes of a particle with several contacts are averaged
+        # (summing them up would add energy in crowds)
+        n_contacts = np.bincount(contacts.ravel(), minlength=self.n_particles)
+        scale = 1 / np.maximum(n_contacts, 1)[:, None]
+        self.velocities += scale * (
+            self._accumulate(first, impulses) - self._accumulate(second, impulses)
+        )
+        displacements += scale * (
+            self._accumulate(second, pushes) - self._accumulate(first, pushes)
+        )
+        return displacements
+
+    def _accumulate(self, indices: np.ndarray, values: np.ndarray) -> np.ndarray:
+        """Sums the (m, 2) values per particle index (a faster np.add.at)."""
+        return np.stack(
+            [
+                np.bincount(indices, weights=values[:, 0], minlength=self.n_particles),
+                np.bincount(indices, weights=values[:, 1], minlength=self.n_particles),
+            ],
+            axis=1,
+        )
+
+    def is_wall(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Returns whether the cells at the given coordinates are walls."""
+        x_cells = np.clip(x.astype(np.int64), 0, self.width - 1)
+        y_cells = np.clip(y.astype(np.int64), 0, self.height - 1)
+        return self.world_array[x_cells, y_cells] != 0
+
+    def move(self, displacements: np.ndarray) -> None:
+        """
+        Moves all particles by the given displacements, one axis after the other. If the leading edge of a particle
+        would enter a wall cell (at the end or the middle of its move), the particle stays and bounces off the wall.
+        Particles that are inside of a wall (e.g. pushed there by other particles) can always move.
+        """
+        for axis in range(2):
+            current = self.positions[:, axis]
+            step = displacements[:, axis]
+            edge_offset = np.sign(step) * self.radius
+            inside_wall = self.is_wall(self.positions[:, 0], self.positions[:, 1])
+
+            probes = self.positions.copy()
+            probes[:, axis] = current + step + edge_offset
+            blocked = self.is_wall(probes[:, 0], probes[:, 1])
+            probes[:, axis] = current + 0.5 * step + edge_offset
+            blocked |= self.is_wall(probes[:, 0], probes[:, 1])
+            blocked &= ~inside_wall
+
+            self.positions[:, axis] = np.where(blocked, current, current + step)
+            self.velocities[blocked, axis] *= -self.elasticity
+
+        # particles can't leave the world (e.g. when they are pushed out of a crowd at the border)
+        np.clip(self.positions[:, 0], self.radius, self.width - 1 - self.radius, out=self.positions[:, 0])
+        np.clip(self.positions[:, 1], self.radius, self.height - 1 - self.radius, out=self.positions[:, 1])
+
+    def step(self, dt: float) -> None:
+        """
+        Advances all particles by dt seconds and updates the contact pairs.
+        """
+        contacts = self.find_contacts()
+        displacements = self.resolve_contacts(contacts)
+        self.move(self.velocities * dt + displacements)
+
+        # the new contacts are the pairs that didn't touch in the previous timestep
+        # (the keys are sorted, because the pairs are sorted)
+        keys = contacts[:, 0] * self.n_particles + contacts[:, 1]
+        is_new = ~np.isin(keys, self.contact_keys, assume_unique=True)
+        self.contacts = contacts
+        self.new_contacts = contacts[is_new]
+        self.contact_keys = keys
@@ -4,139 +4,115 @@ import pygame as pg
 import pymunk
 import numpy as np
 import skimage.measure as measure
+import skimage.graph as graph
 import random
-import os
-
-from typing import Tuple, List, Optional, Union
 
+from heatmap_cache import HeatmapCache
+from shared_fields import SharedFields
 
-class Node:
-    """
-    A node object that stores its coordinates and distance to the target cell.
-    The nodes are used for building a search tree.
-    """
-
-    def __init__(
-        self, coordinates: Tuple[int, int], distance: Optional[float] = None
-    ) -> None:
-        self.x = coordinates[0]
-        self.y = coordinates[1]
-        self.distance = distance
-
-    def coordinates(self) -> Tuple[int, int]:
-        """Returns the coordinates of the node."""
-        return (self.x, self.y)
-
-    def get_neighbors(self, world_array: np.ndarray) -> List[Node]:
-        """Returns all valid neighboring nodes of the current node."""
-        neighbors = []
-        for x_delta in [-1, 0, 1]:
-            for y_delta in [-1, 0, 1]:
-                # calculate the coordinates of a neighboring node
-                neighbor_x = self.x + x_delta
-                neighbor_y = self.y + y_delta
-
-                # make sure that the neighbor is a node in the world_array
-                if (
-                    neighbor_x < 0
-                    or neighbor_x > 799
-                    or neighbor_y < 0
-                    or neighbor_y > 799
-                ):  # XXX
-                    continue
-
-                # disregard if the neighbor node is a wall
-                if world_array[neighbor_x, neighbor_y] == 1:
-                    continue
-
-                # exclude the origin node (self) from the neighbors
-                if x_delta == 0 and y_delta == 0:
-                    continue
-
-                # check that the neighbor is in the bounds of the world array
-                if neighbor_x < 0 or neighbor_x > 799:
-                    continue
-                if neighbor_y < 0 or neighbor_y > 799:
-                    continue
-
-                # append the valid neighbor to the neighbors list
-                neighbor = Node(coordinates=(neighbor_x, neighbor_y))
-                neighbors.append(neighbor)
-
-        # return a list of all neighbor nodes
-        return neighbors
-
-    def distance_to_neighbor(self, neighbor: Node) -> float:
-
-        """Returns the euclidian distance to a neighboring cell (node).
-        From node "X", the distance is defined as follows:
-
-        sqrt(2) | 1 | sqrt(2)
-        --------|---|--------
-           1    | X |   1
-        --------|---|--------
-        sqrt(2) | 1 | sqrt(2)
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Tuple, List, Optional, Union
 
-        """
-        # check that both nodes are neighbors
-        if not self.x in [
-            neighbor.x + x_delta for x_delta in [-1, 0, 1]
-        ] or not self.y in [neighbor.y + y_delta for y_delta in [-1, 0, 1]]:
-            raise Exception(
-                f"Error: {self.coordinates()} and {neighbor.coordinates()} are not neighbors!"
-            )
 
-        # check that they are not the same node
-        if self.coordinates() == neighbor.coordinates():
-            raise Exception(
-                f"Error: {self.coordinates()} and {neighbor.coordinates()} are the same node!"
-            )
+# offsets (x_delta, y_delta) of the 8 neighboring cells (x-major order)
+# (a direction code is the index of the offset in this array)
+DIRECTIONS = np.array(
+    [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)], dtype=int
+)
+NO_DIRECTION = 8  # direction code for cells without a passable neighbor
 
-        # check if they are direct neighbors (-> distance=1)
-        if (
-            self.x == neighbor.x
-            and self.y in [neighbor.y + y_delta for y_delta in [-1, 0, 1]]
-            or self.y == neighbor.y
-            and self.x in [neighbor.x + x_delta for x_delta in [-1, 0, 1]]
-        ):
-            return 1
+# the heatmaps are stored as uint16 fixed-point distances with a resolution of 1/HEATMAP_SCALE pixels
+# (walls and unreachable cells are stored as UNREACHABLE)
+HEATMAP_SCALE = 16
+UNREACHABLE = np.iinfo(np.uint16).max
 
-        # if they are not direct neighbors, they are diagonal neighbors (-> distance=sqrt(2))
-        return np.sqrt(2)
 
+def compute_heatmap(world_array: np.ndarray, target: Tuple[int, int]) -> np.ndarray:
+    """
+    Computes the geodesic distance from every cell of the world array to the target cell.
+    Cells are 8-connected: a step to a direct neighbor costs 1 and a diagonal step costs sqrt(2).
+    Walls and cells that can't reach the target have an infinite distance.
+    (This is a module-level function so that it can be sent to worker processes.)
+    """
+    # walls have infinite cost (=impassable), every other cell costs 1 to pass through
+    costs = np.where(world_array == 1, np.inf, 1.0)
 
-class Queue:
-    """A queue that is used for tree search."""
+    # run Dijkstra's algorithm from the target (the diagonal steps are weighted with sqrt(2))
+    mcp = graph.MCP_Geometric(costs, fully_connected=True)
+    heatmap, _ = mcp.find_costs([target])
+    return heatmap
 
-    def __init__(self, start_node: Node) -> None:
-        """Starts the tree search from the start_node."""
-        self.queue = [start_node]
-        self.enqueued_coordinates = {start_node.coordinates()}
 
-    def add_node(self, node: Node) -> None:
-        """Inserts a node as first element of the queue if no node with the same corresponding cell is already enqueued"""
-        if node.coordinates() not in self.enqueued_coordinates:
-            self.queue = [node] + self.queue
-            self.enqueued_coordinates.add(node.coordinates())
+def quantize_heatmap(heatmap: np.ndarray) -> np.ndarray:
+    """
+    Converts a heatmap with float distances into the compact uint16 format (see HEATMAP_SCALE).
+    """
+    quantized = np.full(heatmap.shape, UNREACHABLE, dtype=np.uint16)
+    reachable = np.isfinite(heatmap)
+    quantized[reachable] = np.minimum(
+        np.round(heatmap[reachable] * HEATMAP_SCALE), UNREACHABLE - 1
+    )
+    return quantized
 
-    def remove_node(self) -> Node:
-        """Removes a node from the set of enqueued nodes and returns the node in front, meaning the one with highest index
-        (the one that 'waited' the longest)."""
-        node = self.queue.pop()
-        self.enqueued_coordinates.remove(node.coordinates())
-        return node
 
-    def has_elements(self) -> bool:
-        """Returns True if the Queue has elements and False otherwise."""
-        return bool(self.queue)
+def compute_direction_field(world_array: np.ndarray, heatmap: np.ndarray) -> np.ndarray:
+    """
+    Creates a direction field for the given heatmap: for every cell, it stores the direction code
+    (index in DIRECTIONS) of the passable neighbor with the shortest distance to the target,
+    or NO_DIRECTION if the cell has no passable neighbor.
+    """
+    width, height = world_array.shape
+
+    # pad the heatmap and the passable cells, so that cells outside of the world are never picked
+    padded_heatmap = np.pad(heatmap.astype(float), 1, constant_values=np.inf)
+    padded_passable = np.pad(world_array == 0, 1, constant_values=False)
+
+    # gather the distances of all 8 neighbors of every cell (walls count as infinitely far away)
+    neighbor_distances = np.empty((len(DIRECTIONS), width, height))
+    for code, (x_delta, y_delta) in enumerate(DIRECTIONS):
+        neighbor_slice = (
+            slice(1 + x_delta, width + 1 + x_delta),
+            slice(1 + y_delta, height + 1 + y_delta),
+        )
+        neighbor_distances[code] = np.where(
+            padded_passable[neighbor_slice], padded_heatmap[neighbor_slice], np.inf
+        )
+
+    # pick the neighbor with the shortest distance (ties go to the first neighbor in DIRECTIONS)
+    direction_field = np.argmin(neighbor_distances, axis=0).astype(np.uint8)
+    direction_field[np.isinf(neighbor_distances.min(axis=0))] = NO_DIRECTION
+    return direction_field
+
+
+def compute_pathfinding_fields(
+    world_array: np.ndarray, target: Tuple[int, int]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Computes the compact heatmap and the direction field for one target.
+    (Worker processes return both fields, so only the small arrays have to be sent back.)
+    """
+    heatmap = compute_heatmap(world_array, target)
+    return quantize_heatmap(heatmap), compute_direction_field(world_array, heatmap)
 
 
 class Pathfinder:
-    def __init__(self, sim, use_precomputed_heatmaps: bool) -> None:
+    def __init__(
+        self,
+        sim,
+        use_precomputed_heatmaps: bool,
+        n_workers: Optional[int] = None,
+        cache_dir: str = "heatmaps",
+        max_cached_maps: int = 4,
+    ) -> None:
         """
         Initializes the Pathfinder object and creates the world array, a list of target positions
         that is used for picking a target, and loads or computes a heatmap tensor that is used for the
         vector-based pathfinding.
+        The heatmaps are looked up in a cache (in cache_dir) that is keyed by the world geometry and the targets.
+        If use_precomputed_heatmaps is True, missing heatmaps are computed automatically (reusing all targets
+        that were already computed for the same world), otherwise all heatmaps are recomputed.
+        The heatmaps are computed in parallel by n_workers processes (default: one per CPU core).
         """
         # create the world as a 2d-array
         self.world_array = self.create_world_array(sim)
@@ -175,67 +151,87 @@ class Pathfinder:
             (540, 700),  # 29: building 35
         ]
 
-        # we have 30 target buildings to pick from
-        n_targets = len(self.targets)
-
-        self.heatmap_tensor = None  # will be initialized in the following lines
+        # the heatmaps (quantized distances to the targets, see HEATMAP_SCALE) and direction fields
+        # with shape (n_targets, width, height) are memory-mapped, so the pages of a target are only
+        # read from the disk once an agent picks that target (and they are shared between processes via the OS cache)
+        self.heatmap_tensor = None
+        self.direction_field = None
 
-        if use_precomputed_heatmaps:
-            # load the precomputed heatmap tensor
-            self.load_heatmap_tensor()
+        # the cache for the precomputed heatmaps
+        self.cache = HeatmapCache(cache_dir, max_entries=max_cached_maps)
 
-        else:
-            # compute the heatmaps for all targets
-            self.heatmap_tensor = np.empty((n_targets, 800, 800))
-            print(
-                "computing heatmaps with shape",
-                self.heatmap_tensor.shape,
-                "[this may take a while!]",
+        if not (use_precomputed_heatmaps and self.load_heatmap_tensor()):
+            # compute the heatmaps for all targets (that are not cached yet)
+            self.heatmap_tensor, self.direction_field = self.create_heatmap_tensor(
+                n_workers, reuse_cached_targets=use_precomputed_heatmaps
             )
+            self.save_heatmap_tensor(replace=not use_precomputed_heatmaps)
 
-            for i, target in enumerate(self.targets):
-                print(f"creating heatmap... [{i+1}/{n_targets}]")
-
-                # create the target node
-                target_node = Node(coordinates=target, distance=0)
-
-                # create the heatmap for that target node
-                self.heatmap_tensor[i] = self.create_heatmap(target_node)
-            self.save_heatmap_tensor()
+            # replace the computed fields by read-only memory maps of the saved files
+            self.load_heatmap_tensor()
 
         # add the pathfinder instance to the given simulator
         sim.pf = self
 
-    def save_heatmap_tensor(self) -> None:
+    def share(self) -> SharedFields:
         """
-        Saves the heatmap tensor as a numpy file in the 'heatmaps' directory.
+        Copies the world array, the heatmap tensor and the direction field into a shared memory block
+        and returns it (see SharedFields). Worker processes can then create their pathfinder with attach_shared
+        instead of loading their own copies. The calling process owns the block and has to close it
+        once the workers are done.
         """
-
-        # create the heatmaps directory if it doesn't exist yet
-        if not os.path.exists("heatmaps"):
-            os.mkdir("heatmaps")
-
-        # save the given heatmap tensor as a numpy file
-        np.save("heatmaps/heatmap_tensor.npy", self.heatmap_tensor)
-        print("saved heatmap_tensor with shape", self.heatmap_tensor.shape)
-
-    def load_heatmap_tensor(self) -> None:
+        return SharedFields(
+            {
+                "world_array": self.world_array,
+                "heatmap_tensor": self.heatmap_tensor,
+                "direction_field": self.direction_field,
+            },
+            metadata={"targets": self.targets},
+        )
+
+    @classmethod
+    def attach_shared(cls, sim, shared_fields: SharedFields) -> Pathfinder:
+        """
+        Creates a pathfinder that uses read-only views of the fields in the given shared memory block
+        (see share) and adds it to the given simulator. Nothing is loaded or computed.
+        """
+        pathfinder = cls.__new__(cls)
+        pathfinder.world_array = shared_fields.get("world_array")
+        pathfinder.targets = list(shared_fields.metadata["targets"])
+        pathfinder.heatmap_tensor = shared_fields.get("heatmap_tensor")
+        pathfinder.direction_field = shared_fields.get("direction_field")
+        pathfinder.cache = None  # the fields are neither loaded from nor stored in the cache
+        pathfinder.shared_fields = shared_fields  # keeps the process attached to the block
+        sim.pf = pathfinder
+        return pathfinder
+
+    def save_heatmap_tensor(self, replace: bool = False) -> None:
         """
-        Loads a precomputed heatmap tensor from the 'heatmaps' directory.
+        Saves the heatmap tensor and the direction field in the heatmap cache
+        (replacing an existing entry for the same world and targets if replace is True).
         """
+        self.cache.store(
+            self.world_array,
+            self.targets,
+            self.heatmap_tensor,
+            self.direction_field,
+            replace=replace,
+        )
+
+    def load_heatmap_tensor(self) -> bool:
+        """
+        Memory-maps the heatmap tensor and direction field for the current world and targets from the heatmap cache.
+        Returns False if they haven't been computed yet.
+        """
+        fields = self.cache.load(self.cache.get_key(self.world_array, self.targets))
+        if fields is None:
+            print("no precomputed heatmaps found for this world and targets")
+            return False
 
-        if os.path.isfile("heatmaps/heatmap_tensor.npy"):
-            # load a precomputed heatmap tensor
-            self.heatmap_tensor = np.load("heatmaps/heatmap_tensor.npy")
-            print("using precomputed heatmaps with shape", self.heatmap_tensor.shape)
-        
-        else:
-            # the heatmap tensor doesn't exist yet
-            raise Exception(
-                "Heatmap-Tensor not found Error: \n \
-                The heatmap tensor doesn't exist yet. Set use_precomputed_heatmaps to True and run the code again \
-                    to compute it. (this only has to be done once, set use_precomputed_heatmaps=False in all preceeding runs)"
-            )
+        # map the precomputed fields (nothing is read from the disk until a target is used)
+        self.heatmap_tensor, self.direction_field = fields
+        print("using precomputed heatmaps with shape", self.heatmap_tensor.shape)
+        return True
 
     def create_world_array(self, sim) -> np.ndarray:
         """
@@ -266,69 +262,86 @@ class Pathfinder:
         print("world_array shape:", world_array.shape)
         return world_array
 
-    def create_heatmap(self, target_node: Node) -> np.ndarray:
-        """Creates a heatmap starting to a target node (starting from the target coordinates)."""
-        # create a Queue object that is used to store nodes while searching
-        queue = Queue(target_node)
-
-        # expand the heatmap as long as there are nodes with no distance to the target
-        self.visited = dict()  # dict that maps coordinates to the corresponding node
-
-        while queue.has_elements():
-            current_node = queue.remove_node()
-            self.expand_heatmap(queue, current_node)
-
-        heatmap = np.zeros((800, 800), dtype=int)
-        for coordinates, node in self.visited.items():
-            heatmap[coordinates] = node.distance
-
-        return heatmap
-
-    def expand_heatmap(self, queue: Queue, current_node: Node) -> None:
+    def create_heatmap_tensor(
+        self, n_workers: Optional[int] = None, reuse_cached_targets: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray]:
         """
-        Visits the neighbors of the current node, updates their distances
-        if a shorter path to them is found and adds them to the queue.
+        Computes the heatmaps and direction fields for all targets in parallel and returns them as two tensors
+        with shape (n_targets, width, height): the quantized heatmaps (uint16) and the direction codes (uint8).
+        If reuse_cached_targets is True, targets that are already cached for the same world are copied from the cache.
         """
+        n_targets = len(self.targets)
+        heatmap_tensor = np.empty((n_targets, *self.world_array.shape), dtype=np.uint16)
+        direction_field = np.empty((n_targets, *self.world_array.shape), dtype=np.uint8)
+
+        # copy the targets that were already computed for the same world
+        cached_targets = (
+            self.cache.find_targets(self.world_array, self.targets)
+            if reuse_cached_targets
+            else {}
+        )
+        missing_indices = []
+        for i, target in enumerate(self.targets):
+            if tuple(target) in cached_targets:
+                heatmap_tensor[i], direction_field[i] = cached_targets[tuple(target)]
+            else:
+                missing_indices.append(i)
+        print(
+            f"computing heatmaps for {len(missing_indices)}/{n_targets} targets with shape",
+            heatmap_tensor.shape[1:],
+        )
+
+        # send a compact copy of the world array to the worker processes
+        world_array = self.world_array.astype(np.uint8)
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            fields = executor.map(
+                compute_pathfinding_fields,
+                repeat(world_array),
+                [self.targets[i] for i in missing_indices],
+            )
+            for n_done, (i, (heatmap, directions)) in enumerate(
+                zip(missing_indices, fields)
+            ):
+                print(f"created heatmap... [{n_done+1}/{len(missing_indices)}]")
+                heatmap_tensor[i] = heatmap
+                direction_field[i] = directions
 
-        # set the current node to visited
-        self.visited[current_node.coordinates()] = current_node
+        return heatmap_tensor, direction_field
 
-        # get neighbors of node
-        neighbors = current_node.get_neighbors(self.world_array)
-        for i in range(len(neighbors)):
-            # replace neighbors that have been visited before by the according
-            # nodes to preserve the distance and other attributes
-            if neighbors[i].coordinates() in self.visited.keys():
-                neighbors[i] = self.visited[neighbors[i].coordinates()]
+    def create_heatmap(self, target: Tuple[int, int]) -> np.ndarray:
+        """Creates the heatmap of the distances to the given (x, y) target (see compute_heatmap)."""
+        return compute_heatmap(self.world_array, target)
 
-        for neighbor in neighbors:
+    def create_direction_field(self, heatmap: np.ndarray) -> np.ndarray:
+        """
+        Creates the direction field for the given heatmap (see compute_direction_field).
+        """
+        return compute_direction_field(self.world_array, heatmap)
 
-            # check if the node was not visited before
-            if neighbor.coordinates() not in self.visited.keys():
+    def get_directions(
+        self, positions: np.ndarray, target_buildings: np.ndarray
+    ) -> np.ndarray:
+        """
+        Returns the (x,y) direction vectors that follow the shortest paths to the target buildings
+        for a whole batch of (continuous) positions at once, as an array with shape (n, 2).
+        """
+        width, height = self.world_array.shape
 
-                # set the neighbor's distance
-                neighbor.distance = (
-                    current_node.distance + current_node.distance_to_neighbor(neighbor)
-                )
+        # get the current discrete positions
+        discrete_positions = np.asarray(positions).astype(int)
+        x = np.clip(discrete_positions[:, 0], 0, width - 1)
+        y = np.clip(discrete_positions[:, 1], 0, height - 1)
 
-                # append neighbor to queue
-                queue.add_node(neighbor)
+        # look up the precomputed direction codes
+        codes = self.direction_field[target_buildings, x, y]
+        directions = DIRECTIONS[np.minimum(codes, NO_DIRECTION - 1)]
 
-            # node has been visited before
-            else:
-                # check if the current path's distance is shorter
-                # than the neighbors old distance to the target
-                if (
-                    neighbor.distance
-                    > current_node.distance
-                    + current_node.distance_to_neighbor(neighbor)
-                ):
-
-                    # update the distance to the shorter distance
-                    neighbor.distance = (
-                        current_node.distance
-                        + current_node.distance_to_neighbor(neighbor)
-                    )
+        # if no best neighbor was found, use a random direction
+        # (this shouldn't happen and is just a protection against weird edgecases)
+        stuck = codes == NO_DIRECTION
+        if stuck.any():
+            directions[stuck] = np.random.randint(-1, 2, size=(np.count_nonzero(stuck), 2))
+        return directions
 
     def get_direction(
         self, current_position: Tuple[int, int], target_building: int
@@ -339,28 +352,7 @@ class Pathfinder:
         (This direction is later used to update the velocity of a particle so that it finds its way
         to the target.)
         """
-        current_node = Node(coordinates=current_position)
-        neighbors = current_node.get_neighbors(self.world_array)
-
-        # determine the neighbor with the shortest distance to the target
-        best_neighbor = None
-        best_distance = np.inf
-        for neighbor in neighbors:
-
-            neighbor_distance = self.heatmap_tensor[target_building][
-                neighbor.coordinates()
-            ]
-
-            if neighbor_distance < best_distance:
-                best_neighbor = neighbor
-                best_distance = neighbor_distance
-
-        # if no best neighbor was found, return a random direction
-        # (this shouldn't happen and is just a protection against weird edgecases)
-        if best_neighbor is None:
-            return (np.random.choice([-1, 0, 1]), np.random.choice([-1, 0, 1]))
-
-        # calculate the direction vector to the neighbor with the shortest distance
-        direction_x = best_neighbor.x - current_position[0]
-        direction_y = best_neighbor.y - current_position[1]
-        return direction_x, direction_y
+        direction_x, direction_y = self.get_directions(
+            np.array([current_position]), np.array([target_building])
+        )[0]
+        return int(direction_x), int(direction_y)
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import pymunk
+import numpy as np
+
+from objects import (
+    Person,
+    SUSCEPTIBLE,
+    INFECTED,
+    INFECTIOUS,
+    REMOVED,
+    VELOCITY_MULTIPLIER,
+    VEL_UPDATE_RATE,
+)
+
+from scheduler import EventScheduler, AliasTable
+from particles import ParticleEngine
+
+from typing import Tuple, List, Optional, Union
+
+
+class Population:
+    """
+    A structure-of-arrays container for all people in the simulation.
+    The SEIR status, target building and re-targeting timer of every person are stored in contiguous numpy arrays,
+    so that status transitions, target changes and status counts run as one batched operation per timestep.
+    The pymunk bodies of the Person objects remain the physics handles, unless a ParticleEngine is given:
+    then the positions and velocities of all people are stored in the engine's arrays and no Person objects are created.
+    """
+
+    def __init__(
+        self,
+        world: pymunk.Space,
+        pathfinder,
+        n_people: int,
+        init_min: int,
+        init_max: int,
+        avg_incubation_time: int,
+        avg_infectious_time: int,
+        dwell_distribution: str = "geometric",
+        dwell_shape: float = 2.0,
+        collision_radius: int = 10,
+        engine: Optional[ParticleEngine] = None,
+    ) -> None:
+        """
+        Allocates the arrays for n_people persons and creates the Person objects (which write their
+        initial target building and timer into the arrays), or initializes the particles of the given engine.
+        The incubation and infectious times (in timesteps) are sampled from the dwell_distribution:
+        -> "geometric": the same distribution as switching the status with a probability of 1/avg_time in every timestep
+        -> "gamma": a gamma distribution with the shape parameter dwell_shape (and the same average)
+        """
+        if dwell_distribution not in ["geometric", "gamma"]:
+            raise Exception(
+                f"Value Error: Unknown dwell_distribution '{dwell_distribution}' (use 'geometric' or 'gamma')."
+            )
+
+        self.n_people = n_people
+        self.avg_incubation_time = avg_incubation_time
+        self.avg_infectious_time = avg_infectious_time
+        self.dwell_distribution = dwell_distribution
+        self.dwell_shape = dwell_shape
+        self.collision_radius = collision_radius
+        self.engine = engine
+
+        # set a slight bias towards going to the library and mensa
+        # mensa:            building with index 3
+        # library ('IKMZ'): building with index 27
+        self.weights = np.array(
+            [1 / 35 if i not in [3, 27] else 1 / 10 for i in range(30)]
+        )
+        self.n_targets = len(self.weights)
+        self.target_sampler = AliasTable(self.weights)
+
+        # per-person state arrays (index i belongs to self.people[i])
+        self.status = np.full(n_people, SUSCEPTIBLE, dtype=np.int8)
+        self.status_counts = np.array([n_people, 0, 0, 0], dtype=np.int64)  # updated with every transition
+        self.target_building = np.zeros(n_people, dtype=np.int64)
+        self.time_until_next_target = np.zeros(n_people, dtype=np.int64)
+
+        if engine is None:
+            # create the people (the pymunk bodies are added to the world)
+            self.people = [
+                Person(
+                    world=world,
+                    pathfinder=pathfinder,
+                    init_min=init_min,
+                    init_max=init_max,
+                    collision_radius=collision_radius,
+                    population=self,
+                    index=i,
+                )
+                for i in range(n_people)
+            ]
+        else:
+            # initialize the particles like the Person objects (but for all people at once)
+            self.people = []
+            self.init_particles(pathfinder, init_min, init_max)
+
+        # schedule the first target change of every person (times are in simulation milliseconds)
+        self.target_schedule = EventScheduler()
+        self.target_schedule.schedule(self.time_until_next_target, np.arange(n_people))
+
+        # schedule of the next status transition of every infected or infectious person (times are in timesteps)
+        self.status_schedule = EventScheduler()
+
+    def init_particles(self, pathfinder, init_min: int, init_max: int) -> None:
+        """
+        Picks the initial target buildings and timers of all people and places their particles near their targets
+        (see Person.__init__).
+        """
+        self.engine.velocities[:] = np.random.uniform(-20, 20, size=(self.n_people, 2))
+        self.target_building[:] = self.sample_targets(self.n_people)
+
+        # set the initial positions near the targets to avoid large crowds in the center
+        targets = np.array(pathfinder.targets)[self.target_building]
+        init_means = np.random.normal(loc=targets)
+        init_positions = np.random.normal(loc=init_means, scale=50)
+        self.engine.positions[:] = np.clip(init_positions, init_min, init_max).astype(int)
+
+        self.time_until_next_target[:] = np.random.randint(9_000, 72_000, size=self.n_people)
+
+    def get_positions(self) -> np.ndarray:
+        """Returns the positions of all people as an (n, 2) array."""
+        if self.engine is not None:
+            return self.engine.positions
+        return np.array([person.body.position for person in self.people])
+
+    def get_velocities(self) -> np.ndarray:
+        """Returns the velocities of all people as an (n, 2) array."""
+        if self.engine is not None:
+            return self.engine.velocities
+        return np.array([person.body.velocity for person in self.people])
+
+    def get_position(self, index: int) -> Tuple[float, float]:
+        """Returns the position of the person with the given index."""
+        if self.engine is not None:
+            x, y = self.engine.positions[index]
+        else:
+            x, y = self.people[index].body.position
+        return float(x), float(y)
+
+    def sample_targets(self, n: int) -> np.ndarray:
+        """Returns n randomly picked target buildings (indices in the pf.targets list)."""
+        return self.target_sampler.sample(n)
+
+    def sample_dwell_times(self, avg_time: int, n: int) -> np.ndarray:
+        """Returns n sampled dwell times (in timesteps, at least 1) with the given average."""
+        if self.dwell_distribution == "gamma":
+            dwell_times = np.random.gamma(
+                self.dwell_shape, avg_time / self.dwell_shape, size=n
+            )
+            return np.maximum(np.round(dwell_times), 1).astype(np.int64)
+        return np.random.geometric(1 / avg_time, size=n)
+
+    def infect(self, index: int, timestep: int) -> None:
+        """
+        Sets the status of the person with the given index to infected
+        and schedules the person's transition to infectious.
+        """
+        if self.status[index] != SUSCEPTIBLE:
+            return
+        self.status[index] = INFECTED
+        self.status_counts[SUSCEPTIBLE] -= 1
+        self.status_counts[INFECTED] += 1
+        incubation_time = self.sample_dwell_times(self.avg_incubation_time, 1)
+        self.status_schedule.schedule(timestep + incubation_time, [index])
+
+    def infect_many(self, indices: np.ndarray, timestep: int) -> None:
+        """
+        Sets the status of all susceptible people with the given (unique) indices to infected
+        and schedules their transitions to infectious (batched version of infect).
+        """
+        indices = indices[self.status[indices] == SUSCEPTIBLE]
+        self.status[indices] = INFECTED
+        self.status_counts[SUSCEPTIBLE] -= indices.size
+        self.status_counts[INFECTED] += indices.size
+        incubation_times = self.sample_dwell_times(self.avg_incubation_time, indices.size)
+        self.status_schedule.schedule(timestep + incubation_times, indices)
+
+    def update_velocities(self, pathfinder) -> None:
+        """
+        Updates the velocities of all people based on their current positions and target buildings.
+        """
+        # get the current positions and velocities of all bodies
+        positions = self.get_positions()
+        old_velocities = self.get_velocities()
+
+        # get the optimal velocities to follow the paths to the targets (based on the current positions)
+        directions = pathfinder.get_directions(positions, self.target_building)
+
+        # add some noise to the optimal velocities (e.g. for when someone gets trapped somewhere and can't get out or to resolve running into other particles)
+        additive_noise = 4 * np.random.random((self.n_people, 2)) - 2  # [-2 to 2], mean: 0
+
+        # calculate the new velocities
+        new_velocities = (
+            (1 - VEL_UPDATE_RATE) * old_velocities
+            + VEL_UPDATE_RATE * VELOCITY_MULTIPLIER * directions
+            + additive_noise
+        )
+
+        # update the velocities of the bodies
+        if self.engine is not None:
+            self.engine.velocities[:] = new_velocities
+            return
+        for person, velocity in zip(self.people, new_velocities.tolist()):
+            person.body.velocity = velocity
+
+    def update_targets(self, timestep: int) -> None:
+        """
+        Updates the target buildings of all people whose next target change is due at the current simulation time.
+        """
+        due = self.target_schedule.pop_due(timestep)
+        if due.size == 0:
+            return
+
+        # set new random target buildings
+        self.target_building[due] = self.sample_targets(due.size)
+
+        # set for how many timesteps the people will persue their new target buildings
+        self.time_until_next_target[due] = np.random.randint(9_000, 72_000, size=due.size)
+        self.target_schedule.schedule(timestep + self.time_until_next_target[due], due)
+
+    def update_infection_status(self, timestep: int) -> None:
+        """
+        Applies all status transitions that are due in the current timestep
+        (infected -> infectious and infectious -> removed).
+        """
+        due = self.status_schedule.pop_due(timestep)
+        if due.size == 0:
+            return
+
+        becomes_infectious = due[self.status[due] == INFECTED]
+        becomes_removed = due[self.status[due] == INFECTIOUS]
+
+        # the infectious people are removed after their sampled infectious time
+        self.status[becomes_infectious] = INFECTIOUS
+        infectious_times = self.sample_dwell_times(
+            self.avg_infectious_time, becomes_infectious.size
+        )
+        self.status_schedule.schedule(timestep + infectious_times, becomes_infectious)
+
+        self.status[becomes_removed] = REMOVED
+
+        # update the status counts
+        self.status_counts[INFECTED] -= becomes_infectious.size
+        self.status_counts[INFECTIOUS] += becomes_infectious.size - becomes_removed.size
+        self.status_counts[REMOVED] += becomes_removed.size
+
+    def get_status_counts(self) -> Tuple[int, int, int, int]:
+        """
+        Returns a 4-tuple with counts of how many people there are in each of the 4 stages
+        (susceptible, infected, infectious and removed) of our model.
+        """
+        susceptible_count, infected_count, infectious_count, removed_count = self.status_counts.tolist()
+        return susceptible_count, infected_count, infectious_count, removed_count
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import numpy as np
+import pymunk
+import time
+
+from typing import Tuple, List, Optional, Union, Dict
+
+
+# the timed phases of a simulation step (in the order in which they run)
+PHASES = (
+    "world_step",
+    "events",
+    "velocities",
+    "update",
+    "draw",
+    "export",
+    "record",
+    "checkpoint",
+)
+WORLD_STEP, EVENTS, VELOCITIES, UPDATE, DRAW, EXPORT, RECORD, CHECKPOINT = range(
+    len(PHASES)
+)
+
+
+class RunProfiler:
+    """
+    Measures the time that every phase of the simulation loop takes (with a monotonic clock) and counts the
+    calls of the collision callback. Every report_every timesteps a summary with the throughput, the time per phase
+    and the estimated remaining time is printed, and get_report returns the totals of the run.
+    """
+
+    def __init__(self, collision_callback, report_every: Optional[int] = 1_000) -> None:
+        """
+        Initializes the timers. collision_callback is the collision handler's begin-callback that is counted
+        (the profiler's collision_begin method has to be installed in its place).
+        """
+        self.callback = collision_callback
+        self.report_every = report_every
+        self.phase_times = np.zeros(len(PHASES))
+        self.n_steps = 0
+        self.n_collision_calls = 0
+        self.total_time = 0.0
+
+        # state of the current reporting period
+        self.period_phase_times = np.zeros(len(PHASES))
+        self.period_steps = 0
+        self.period_collision_calls = 0
+        self.start()
+
+    def start(self) -> None:
+        """Starts (or restarts after resuming a run) the clock of the current reporting period."""
+        self.period_start_time = time.perf_counter()
+        self.last_time = self.period_start_time
+
+    def collision_begin(
+        self, arbiter: pymunk.Arbiter, space: pymunk.Space, data: Tuple
+    ) -> bool:
+        """Counts the call and passes it on to the collision callback."""
+        self.period_collision_calls += 1
+        return self.callback(arbiter, space, data)
+
+    def count_collisions(self, n_collisions: int) -> None:
+        """Counts collisions that were handled in bulk (without the collision callback)."""
+        self.period_collision_calls += n_collisions
+
+    def start_step(self) -> None:
+        """Marks the beginning of a timestep (the time before it is not attributed to any phase)."""
+        self.last_time = time.perf_counter()
+
+    def lap(self, phase: int) -> None:
+        """Attributes the time since the last lap (or the beginning of the timestep) to the given phase."""
+        current_time = time.perf_counter()
+        self.period_phase_times[phase] += current_time - self.last_time
+        self.last_time = current_time
+
+    def end_step(self, timestep: int, max_timestep: int) -> None:
+        """Ends a timestep and prints a summary at the end of every reporting period."""
+        self.period_steps += 1
+        if self.report_every is not None and timestep % self.report_every == 0:
+            print(self.get_summary(timestep, max_timestep))
+            self.end_period()
+
+    def end_period(self) -> None:
+        """Adds the current reporting period to the totals of the run."""
+        current_time = time.perf_counter()
+        self.total_time += current_time - self.period_start_time
+        self.phase_times += self.period_phase_times
+        self.n_steps += self.period_steps
+        self.n_collision_calls += self.period_collision_calls
+        self.period_phase_times[:] = 0
+        self.period_steps = 0
+        self.period_collision_calls = 0
+        self.period_start_time = current_time
+
+    def get_summary(self, timestep: int, max_timestep: int) -> str:
+        """Returns a one-line summary of the current reporting period."""
+        elapsed_time = time.perf_counter() - self.period_start_time
+        steps_per_second = self.period_steps / elapsed_time if elapsed_time > 0 else 0.0
+        eta = (max_timestep - timestep) / steps_per_second if steps_per_second > 0 else 0.0
+        phase_ms = ", ".join(
+            f"{name} {1000 * phase_time / max(self.period_steps, 1):.2f}"
+            for name, phase_time in zip(PHASES, self.period_phase_times)
+            if phase_time > 0
+        )
+        return (
+            f"timestep {timestep}/{max_timestep} | {steps_per_second:.1f} steps/s | "
+            f"ms/step: {phase_ms} | "
+            f"{self.period_collision_calls / max(self.period_steps, 1):.1f} collisions/step | "
+            f"ETA {eta:.1f}s"
+        )
+
+    def get_report(self) -> Dict:
+        """
+        Returns the totals of the run: the number of timesteps, the throughput, the total time and the time per step
+        (in ms) of every phase, the time that was not attributed to a phase and the number of collision callbacks.
+        """
+        self.end_period()
+        n_steps = max(self.n_steps, 1)
+        phase_total = float(self.phase_times.sum())
+        return {
+            "n_steps": self.n_steps,
+            "total_s": self.total_time,
+            "steps_per_s": self.n_steps / self.total_time if self.total_time > 0 else 0.0,
+            "phase_s": dict(zip(PHASES, self.phase_times.tolist())),
+            "phase_ms_per_step": {
+                name: 1000 * phase_time / n_steps
+                for name, phase_time in zip(PHASES, self.phase_times.tolist())
+            },
+            "other_s": max(self.total_time - phase_total, 0.0),
+            "collision_calls": self.n_collision_calls,
+            "collision_calls_per_step": self.n_collision_calls / n_steps,
+        }
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import pygame as pg
+
+from objects import STATUS_COLORS, RED, LIGHT_GREY
+
+from typing import Tuple, List, Optional, Union
+
+
+class Renderer:
+    """
+    Renders the simulated world on a pygame surface.
+    All images are loaded and scaled once, the static parts of the scene (the map and, in debug-mode,
+    the walls and the grid of dots) are prebaked into a background surface, and every frame only
+    the dirty rectangles around the people and the train are redrawn.
+    """
+
+    def __init__(self, sim, screen: pg.Surface) -> None:
+        """
+        Loads the assets and prebakes the background for the given simulator.
+        """
+        self.screen = screen
+        self.background = self.create_background(sim)
+
+        # load the train image
+        self.train_img = self._convert(
+            pg.transform.scale(pg.image.load("images/train_transparent.png"), (20, 80)),
+            alpha=True,
+        )
+
+        # rectangles that were drawn in the previous frame (they have to be erased in the next frame)
+        self.previous_rects = []
+
+        # draw the background once (afterwards, only dirty rectangles are updated)
+        self.screen.blit(self.background, (0, 0))
+
+    def _convert(self, surface: pg.Surface, alpha: bool = False) -> pg.Surface:
+        """
+        Converts a surface to the pixel format of the display for fast blitting
+        (only possible if a display exists, offscreen surfaces are returned unchanged).
+        """
+        if pg.display.get_surface() is None:
+            return surface
+        return surface.convert_alpha() if alpha else surface.convert()
+
+    def create_background(self, sim) -> pg.Surface:
+        """
+        Creates the background surface with the map of Golm.
+        If the simulator is in debug-mode, the walls of the buildings and a grid of dots
+        (helpful for aligning walls etc.) are also baked into the background.
+        """
+        # draw the background image of Golm
+        background = self._convert(
+            pg.transform.scale(
+                pg.image.load("images/golm_map.png"),
+                (sim.screen_size, sim.screen_size),
+            )
+        )
+
+        # draw the buildings
+        if sim.draw_walls:
+            for building in sim.buildings:
+                for wall in building:
+                    wall.draw(background)
+
+        # draw a grid of dots for testing & debugging
+        if sim.draw_dots:
+            for i in range(80):
+                for j in range(80):
+                    if i % 10 == 0 and j % 10 == 0:
+                        pg.draw.circle(background, RED, (i * 10, j * 10), 2)
+                    else:
+                        pg.draw.circle(background, LIGHT_GREY, (i * 10, j * 10), 2)
+
+        return background
+
+    def draw(self, sim) -> List[pg.Rect]:
+        """
+        Draws the current frame and returns the dirty rectangles that changed since the previous frame.
+        """
+        # erase the train and the people of the previous frame by drawing the background over them
+        for rect in self.previous_rects:
+            self.screen.blit(self.background, rect, rect)
+
+        # draw the train
+        rects = [sim.train.draw(self.screen, self.train_img)]
+
+        # draw all people
+        radius = sim.population.collision_radius
+        colors = [STATUS_COLORS[status] for status in sim.population.status.tolist()]
+        positions = sim.population.get_positions().astype(int).tolist()
+        for position, color in zip(positions, colors):
+            rects.append(pg.draw.circle(self.screen, color, position, radius))
+
+        # both the old and the new positions have to be updated on the display
+        dirty_rects = self.previous_rects + rects
+        self.previous_rects = rects
+        return dirty_rects
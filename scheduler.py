@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import numpy as np
+import heapq
+
+from typing import Tuple, List, Optional, Union
+
+
+class EventScheduler:
+    """
+    A time-ordered schedule of per-person events (a priority queue of (time, person index) pairs).
+    Only the events that are due are processed in a timestep, so the cost per timestep
+    scales with the number of events instead of the population size.
+    """
+
+    def __init__(self) -> None:
+        self.heap = []
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def schedule(self, times: np.ndarray, indices: np.ndarray) -> None:
+        """Schedules an event at times[i] for the person with the index indices[i]."""
+        events = zip(np.asarray(times).tolist(), np.asarray(indices).tolist())
+        if len(self.heap) == 0:
+            # building the heap at once is faster than pushing the events one by one
+            self.heap = list(events)
+            heapq.heapify(self.heap)
+        else:
+            for event in events:
+                heapq.heappush(self.heap, event)
+
+    def pop_due(self, time: int) -> np.ndarray:
+        """Removes all events that are due at the given time and returns the indices of their persons."""
+        due_indices = []
+        while self.heap and self.heap[0][0] <= time:
+            due_indices.append(heapq.heappop(self.heap)[1])
+        return np.array(due_indices, dtype=np.int64)
+
+
+class AliasTable:
+    """
+    A lookup table for drawing batches of samples from a fixed discrete distribution in O(1) per sample
+    (Vose's alias method).
+    """
+
+    def __init__(self, weights: np.ndarray) -> None:
+        """Builds the table for a distribution that is proportional to the given weights."""
+        probabilities = np.asarray(weights, dtype=float)
+        n = len(probabilities)
+        scaled = probabilities * n / probabilities.sum()
+
+        self.probabilities = np.ones(n)
+        self.aliases = np.arange(n)
+
+        # pair every outcome with less than average probability with one with more than average probability
+        small = [i for i in range(n) if scaled[i] < 1]
+        large = [i for i in range(n) if scaled[i] >= 1]
+        while small and large:
+            small_index = small.pop()
+            large_index = large.pop()
+            self.probabilities[small_index] = scaled[small_index]
+            self.aliases[small_index] = large_index
+            scaled[large_index] -= 1 - scaled[small_index]
+            if scaled[large_index] < 1:
+                small.append(large_index)
+            else:
+                large.append(large_index)
+
+    def sample(self, n: int) -> np.ndarray:
+        """Draws n samples (indices of the weights)."""
+        columns = np.random.randint(len(self.probabilities), size=n)
+        keep_column = np.random.random(n) < self.probabilities[columns]
+        return np.where(keep_column, columns, self.aliases[columns])
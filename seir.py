@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import numpy as np
+
+from typing import Tuple, List, Optional, Union, Dict
+
+
+def calibrate_transmission_rate(
+    sim, n_steps: int = 2_000, seed: int = 1, **run_kwargs
+) -> float:
+    """
+    Estimates the transmission rate (beta) of the mean-field SEIR model from a short headless run of the given
+    simulator (which needs a pathfinder): the number of person-to-person transmissions (the ones that are passed on
+    in collision_begin, or in spread_infections in the "distance" infection_mode) per infectious-person-timestep,
+    normalized by the susceptible fraction S/N of every timestep.
+    The rate depends on the density of the population and is proportional to the infection_prob, but it doesn't depend
+    on the incubation and infectious times, so a simulator with a short avg_incubation_time is enough for the
+    calibration. run_kwargs (e.g. speedup_factor) are passed to CovidSim.run.
+    """
+    run_kwargs.update(status_every=1, status_changes_only=False)
+    susceptible, _, infectious, _, transmissions = sim.run(
+        seed=seed, max_timestep=n_steps, return_data=True, **run_kwargs
+    )[:5]
+
+    # the initially infected people (with infector -1) weren't infected by anybody
+    n_transmissions = np.count_nonzero(transmissions["infector"] >= 0)
+    exposure = np.sum(
+        np.asarray(infectious, dtype=np.float64) * np.asarray(susceptible) / sim.n_people
+    )
+    if exposure == 0:
+        raise Exception(
+            "Value Error: Nobody was infectious during the calibration run (use more steps or a shorter avg_incubation_time)."
+        )
+    return float(n_transmissions / exposure)
+
+
+def run_seir(
+    transmission_rate: Union[float, np.ndarray],
+    n_people: Union[int, np.ndarray],
+    avg_incubation_time: Union[int, np.ndarray],
+    avg_infectious_time: Union[int, np.ndarray],
+    n_steps: int,
+    initial_counts: Optional[Union[Tuple[float, float, float, float], np.ndarray]] = None,
+) -> np.ndarray:
+    """
+    Integrates the discrete-time mean-field SEIR model for n_steps timesteps. In every timestep:
+    -> a susceptible person is infected with the probability 1 - exp(-transmission_rate * I / N)
+    -> an infected person becomes infectious with the probability 1 / avg_incubation_time
+    -> an infectious person is removed with the probability 1 / avg_infectious_time
+    (the same average dwell times as the "geometric" dwell_distribution of CovidSim).
+    All parameters can be arrays (that are broadcast against each other) to integrate many scenarios at once.
+    initial_counts are the (susceptible, infected, infectious, removed) counts at timestep 0
+    (default: 3 infected people, like the start of a CovidSim run) and can have the shape (n_scenarios, 4).
+    Returns the expected status counts with the shape (n_steps, 4) like the counts of a CovidSim run
+    (as floats), or with the shape (n_scenarios, n_steps, 4) if several scenarios are given.
+    """
+    transmission_rate, n_people, avg_incubation_time, avg_infectious_time = np.broadcast_arrays(
+        *(
+            np.asarray(value, dtype=np.float64)
+            for value in (transmission_rate, n_people, avg_incubation_time, avg_infectious_time)
+        )
+    )
+    single_scenario = transmission_rate.ndim == 0
+    if np.any(avg_incubation_time < 1) or np.any(avg_infectious_time < 1):
+        raise Exception("Value Error: The average incubation and infectious times have to be at least 1 timestep.")
+
+    if initial_counts is None:
+        initial_counts = np.stack(
+            [n_people - 3, np.full_like(n_people, 3), np.zeros_like(n_people), np.zeros_like(n_people)],
+            axis=-1,
+        )
+    counts = np.array(
+        np.broadcast_to(initial_counts, (*transmission_rate.shape, 4)), dtype=np.float64
+    ).reshape(-1, 4)
+    susceptible, infected, infectious, removed = counts.T.copy()
+
+    # the parameters of all scenarios as flat arrays
+    rate = transmission_rate.reshape(-1) / n_people.reshape(-1)
+    incubation_prob = 1 / avg_incubation_time.reshape(-1)
+    removal_prob = 1 / avg_infectious_time.reshape(-1)
+
+    series = np.empty((len(rate), n_steps, 4))
+    for step in range(n_steps):
+        new_infected = susceptible * -np.expm1(-rate * infectious)
+        new_infectious = infected * incubation_prob
+        new_removed = infectious * removal_prob
+
+        susceptible -= new_infected
+        infected += new_infected - new_infectious
+        infectious += new_infectious - new_removed
+        removed += new_removed
+
+        series[:, step, 0] = susceptible
+        series[:, step, 1] = infected
+        series[:, step, 2] = infectious
+        series[:, step, 3] = removed
+
+    if single_scenario:
+        return series[0]
+    return series.reshape(*transmission_rate.shape, n_steps, 4)
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import numpy as np
+
+from multiprocessing import shared_memory
+from typing import Tuple, List, Optional, Union, Dict
+
+
+# byte alignment of the arrays in the shared memory block
+ALIGNMENT = 64
+
+
+class SharedFields:
+    """
+    A set of read-only numpy arrays in a single shared memory block (multiprocessing.shared_memory).
+    The process that creates the block owns it and has to unlink it when the workers are done (e.g. by using
+    the object as a context manager). Pickling the object only pickles the name and the layout of the block,
+    so a worker that unpickles it (e.g. from the initargs of a process pool) attaches to the same memory
+    and gets views of the arrays without copying them.
+    """
+
+    def __init__(self, arrays: Dict[str, np.ndarray], metadata: Optional[Dict] = None) -> None:
+        """
+        Creates a shared memory block and copies the given arrays into it.
+        metadata is a dict of small picklable values (e.g. the targets) that is passed on to the workers.
+        """
+        # layout of the block: name -> (offset, shape, dtype)
+        self.layout = {}
+        size = 0
+        for name, array in arrays.items():
+            size = -(-size // ALIGNMENT) * ALIGNMENT
+            self.layout[name] = (size, array.shape, array.dtype.str)
+            size += array.nbytes
+        self.metadata = metadata or {}
+
+        self.shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        self.is_owner = True
+        for name, array in arrays.items():
+            self._view(name, read_only=False)[...] = array
+
+    def __getstate__(self) -> Dict:
+        """Returns the name and the layout of the block (the workers attach to the block by its name)."""
+        return {"name": self.shm.name, "layout": self.layout, "metadata": self.metadata}
+
+    def __setstate__(self, state: Dict) -> None:
+        """Attaches to the shared memory block of the owner."""
+        self.layout = state["layout"]
+        self.metadata = state["metadata"]
+        self.shm = shared_memory.SharedMemory(name=state["name"])
+        self.is_owner = False
+
+    def _view(self, name: str, read_only: bool = True) -> np.ndarray:
+        """Returns a view of an array in the shared memory block."""
+        offset, shape, dtype = self.layout[name]
+        array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf, offset=offset)
+        array.flags.writeable = not read_only
+        return array
+
+    def get(self, name: str) -> np.ndarray:
+        """Returns a read-only view of the array with the given name (nothing is copied)."""
+        return self._view(name)
+
+    @property
+    def nbytes(self) -> int:
+        """The size of the shared memory block in bytes."""
+        return self.shm.size
+
+    def close(self) -> None:
+        """
+        Detaches this process from the block (all views of the arrays have to be deleted before)
+        and removes the block if this process owns it.
+        """
+        self.shm.close()
+        if self.is_owner:
+            self.shm.unlink()
+
+    def __enter__(self) -> SharedFields:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -6,10 +6,38 @@ import numpy as np
 import skimage.measure as measure
 import random
 import os
+import pickle
+import copy
+import math
+import time
 
-from objects import Person, Wall, Train
+from objects import (
+    Wall,
+    Train,
+    SUSCEPTIBLE,
+    INFECTIOUS,
+    PERSON_COLLISION_TYPE,
+)
+from population import Population
+from renderer import Renderer
+from video import FrameWriter
+from transmission_log import TransmissionLog
+from telemetry import TelemetryWriter, open_run
+from particles import ParticleEngine
+from spatial_hash import SpatialHashGrid
+from profiler import (
+    RunProfiler,
+    WORLD_STEP,
+    EVENTS,
+    VELOCITIES,
+    UPDATE,
+    DRAW,
+    EXPORT,
+    RECORD,
+    CHECKPOINT,
+)
 
-from typing import Tuple, List, Optional, Union
+from typing import Tuple, List, Optional, Union, Dict
 
 
 # constants
@@ -37,19 +65,87 @@ class CovidSim:
         avg_infectious_time: int = 10_000,
         debug_mode: bool = False,
         FPS: int = 60,
+        headless: bool = False,
+        dwell_distribution: str = "geometric",
+        dwell_shape: float = 2.0,
+        physics_backend: str = "pymunk",
+        infection_mode: str = "contact",
+        infection_radius: float = 10.0,
+        infection_every: int = 1,
+        infection_falloff: float = 1.0,
+        physics_threads: int = 1,
+        broadphase: str = "bbtree",
+        solver_iterations: int = 10,
+        auto_tune_physics: bool = False,
+        max_physics_dt: Optional[float] = None,
+        substeps: int = 1,
+        adaptive_substeps: bool = False,
     ) -> None:
         """
         Initialize the simulation with the given parameters. This includes setting the number of people,
         the infection probability, the average incubation and infectious times, and the FPS of the visual output.
+        The incubation and infectious times of every person are sampled from the dwell_distribution
+        ("geometric" or "gamma" with the shape parameter dwell_shape) with the given averages.
+        In headless mode, the simulation runs without a pygame window, clock throttling or rendering,
+        so it is only limited by compute.
+        The physics_backend simulates the people either as pymunk bodies ("pymunk") or as particles of a
+        vectorized ParticleEngine ("numpy"), which scales to much larger populations. With the "numpy" backend,
+        people bounce off the walls of the pathfinder's world array, but they don't collide with the train.
+        The infection_mode defines how the infection spreads:
+        -> "contact": an infectious person infects a susceptible person with the probability infection_prob when they collide
+        -> "distance": every infection_every timesteps, every susceptible person within the infection_radius of an infectious
+           person is infected with the probability infection_prob * (1 - distance / infection_radius) ** infection_falloff
+           (combined over all infectious people nearby), independent of the physics
+        The pymunk space steps with physics_threads threads (1 or 2, because pymunk doesn't use more than 2 threads;
+        2 threads are not supported on Windows and the results of a run might then depend on the thread scheduling), finds colliding shapes with the given broadphase
+        ("bbtree" or "spatial_hash", which is sized from the collision radius and the number of people) and runs
+        solver_iterations iterations of the contact solver per step. If auto_tune_physics is True, the fastest
+        thread count and broadphase are picked by a short benchmark before the first run (see tune_physics).
+        Every timestep advances the physics by speedup_factor / FPS seconds in at least substeps substeps, and in more
+        substeps if that time exceeds max_physics_dt (in seconds) or if adaptive_substeps is True and the fastest person
+        would move further than its collision radius in one substep. This keeps the physics (and the contact rates)
+        independent of the speedup_factor.
         """
+        if physics_backend not in ["pymunk", "numpy"]:
+            raise Exception(
+                f"Value Error: Unknown physics_backend '{physics_backend}' (use 'pymunk' or 'numpy')."
+            )
+        if broadphase not in ["bbtree", "spatial_hash"]:
+            raise Exception(
+                f"Value Error: Unknown broadphase '{broadphase}' (use 'bbtree' or 'spatial_hash')."
+            )
+        if substeps < 1 or (max_physics_dt is not None and max_physics_dt <= 0):
+            raise Exception(
+                "Value Error: The number of substeps has to be at least 1 and max_physics_dt has to be positive."
+            )
+        if physics_threads not in [1, 2]:
+            raise Exception(
+                f"Value Error: pymunk steps with 1 or 2 threads (got physics_threads={physics_threads})."
+            )
+        if auto_tune_physics and physics_backend != "pymunk":
+            raise Exception(
+                "Value Error: auto_tune_physics only tunes the pymunk space (use physics_backend='pymunk')."
+            )
+        if infection_mode not in ["contact", "distance"]:
+            raise Exception(
+                f"Value Error: Unknown infection_mode '{infection_mode}' (use 'contact' or 'distance')."
+            )
+        if infection_every < 1 or infection_radius <= 0:
+            raise Exception(
+                "Value Error: infection_every has to be at least 1 and the infection_radius has to be positive."
+            )
 
         # simulator setup
         self.n_people = n_people
-        self.collision_points = [] # will be filled with points where collisions occured for plotting a heatmap later
-        self.status_counts = (
-            []
-        )  # will be filled with 4-tuples of counts for every status (susceptible/infected/infectious/removed)
+        self.transmissions = TransmissionLog()  # will be filled with all transmission events (e.g. for plotting a heatmap of the infection points later)
+        self.status_counts = None  # will be an array with shape (n_records, 4) with the counts for every status (susceptible/infected/infectious/removed)
+        self.status_timesteps = None  # will be an array with the timesteps of the recorded status counts
         self.pf = None  # will be set later because the pathfinder needs attributes from the sim for initialization
+        self.population = None  # will be created at the start of every run
+        self.engine = None  # will be created at the start of every run (only for the "numpy" physics_backend)
+        self.renderer = None  # will be created at the start of every (non-headless) run
+        self.profiler = None  # will be created at the start of every profiled run
+        self.profile_report = None
         
 
 
@@ -57,17 +153,37 @@ class CovidSim:
         self.screen_size = 800
         self.width, self.height = (self.screen_size, self.screen_size)
         self.FPS = FPS
+        self.headless = headless
 
         # useful simulator attributes
         self.draw_dots = debug_mode
         self.draw_walls = debug_mode
         self.speedup_factor = 1
         self.running = True
+        self.timestep = 0  # integer simulation timestep (one step per logical frame)
 
         # hyperparameters
         self.infection_prob = infection_prob
         self.avg_incubation_time = avg_incubation_time
         self.avg_infectious_time = avg_infectious_time
+        self.dwell_distribution = dwell_distribution
+        self.dwell_shape = dwell_shape
+        self.physics_backend = physics_backend
+        self.infection_mode = infection_mode
+        self.infection_radius = infection_radius
+        self.infection_every = infection_every
+        self.infection_falloff = infection_falloff
+
+        # physics settings
+        self.collision_radius = 2
+        self.physics_threads = physics_threads
+        self.broadphase = broadphase
+        self.solver_iterations = solver_iterations
+        self.auto_tune_physics = auto_tune_physics
+        self.physics_tuned = False
+        self.max_physics_dt = max_physics_dt
+        self.substeps = substeps
+        self.adaptive_substeps = adaptive_substeps
 
         # setup screen_borders, buildings
         self.world = None
@@ -81,7 +197,8 @@ class CovidSim:
         """
 
         # create the simulated world
-        self.world = pymunk.Space()
+        self.world = pymunk.Space(threaded=self.physics_threads > 1)
+        self.configure_space(self.world)
 
         # add screen borders as walls
         self.screen_borders = [
@@ -144,55 +261,187 @@ class CovidSim:
     ) -> bool:
         """
         This custom pre-collision-handling method handles infection spreading
-        when two persons collide.
+        when two persons collide (it is only called for collisions between people, see install_collision_handler).
         It also has to return True so the default PyMunk collision handler can handle
         changes of physical attributes afterwards (e.g. updating the velocity).
         """
-        involves_infected_person = False
-
-        for shape in arbiter.shapes:
-            # check if the collision involves an object that is not a person (e.g. a wall)
-            if shape.__class__ == pymunk.shapes.Segment:
-                return True
-
-            # check if a person is infectious
-            if shape.density == 0.8:  # (0.8 is the key for infectious)
-                involves_infected_person = True
-
-        if involves_infected_person:
-            for shape in arbiter.shapes:
-                if shape.density == 1.0:  # (1.0 is the key for susceptible)
-                    # "infection_prob" is the probability that infection status is shared when colliding
-                    if random.random() < self.infection_prob:
-                        # set the density to 0.9 to signal that the person is now infected
-                        # -> the infection status will be set in the next timestep automatically
-                        shape.density = 0.9
-
-                        # save where the infectios collision occured
-                        self.collision_points.append(shape.body.position)
+        # resolve the indices of both persons (only collisions between people are routed to this handler)
+        shape_a, shape_b = arbiter.shapes
+        self.transmit(shape_a.agent_id, shape_b.agent_id)
         return True
 
+    def transmit(self, index_a: int, index_b: int) -> None:
+        """
+        Handles a contact between the people with the given indices: if one of them is infectious and the other one is
+        susceptible, the infection is passed on with the probability infection_prob (and the transmission is logged).
+        """
+        # check if an infectious person collided with a susceptible person
+        status = self.population.status
+        status_a, status_b = status[index_a], status[index_b]
+        if status_a == INFECTIOUS and status_b == SUSCEPTIBLE:
+            infector, infectee = index_a, index_b
+        elif status_b == INFECTIOUS and status_a == SUSCEPTIBLE:
+            infector, infectee = index_b, index_a
+        else:
+            return
+
+        # "infection_prob" is the probability that infection status is shared when colliding
+        if random.random() < self.infection_prob:
+            self.population.infect(infectee, self.timestep)
+
+            # log the transmission (including where the infectious collision occured)
+            x, y = self.population.get_position(infectee)
+            self.transmissions.append(self.timestep, infector, infectee, x, y)
+
+    def spread_infections(self) -> None:
+        """
+        Infects susceptible people near infectious people (the "distance" infection_mode) in one vectorized pass:
+        the susceptible people are sorted into a grid (with the infection_radius as cell size), so only the cells
+        around every infectious person have to be searched. Every susceptible person is infected with the combined
+        probability of all infectious people within the infection_radius, and the transmission is attributed to the
+        infectious person with the highest probability (the closest one).
+        Every pass costs O(N): the positions of all people are fetched and the grid is rebuilt over all susceptible
+        people (they move in every timestep, so the grid can't be kept). Only the search itself scales with the number
+        of infectious people and their neighborhoods, so infection_every is the knob for the cost of this pass.
+        """
+        status = self.population.status
+        infectious = np.flatnonzero(status == INFECTIOUS)
+        susceptible = np.flatnonzero(status == SUSCEPTIBLE)
+        if infectious.size == 0 or susceptible.size == 0:
+            return
+
+        # find all pairs of infectious and susceptible people within the infection radius
+        positions = self.population.get_positions()
+        susceptible_positions = positions[susceptible]
+        self.infection_grid.build(susceptible_positions)
+        pairs = self.infection_grid.query_neighbors(
+            positions[infectious], susceptible_positions, self.infection_radius
+        )
+        if self.profiler is not None:
+            self.profiler.count_collisions(len(pairs))
+        if len(pairs) == 0:
+            return
+
+        # distance-dependent infection probabilities of all pairs
+        infectors = infectious[pairs[:, 0]]
+        distances = np.sqrt(
+            np.sum((positions[infectors] - susceptible_positions[pairs[:, 1]]) ** 2, axis=1)
+        )
+        probabilities = (
+            self.infection_prob
+            * (1 - distances / self.infection_radius) ** self.infection_falloff
+        )
+
+        # combine the probabilities per susceptible person: 1 - product of the probabilities of not being infected
+        with np.errstate(divide="ignore"):
+            log_escape = np.bincount(
+                pairs[:, 1], weights=np.log1p(-probabilities), minlength=susceptible.size
+            )
+        candidates = np.unique(pairs[:, 1])
+        infection_probabilities = 1 - np.exp(log_escape[candidates])
+
+        # the infector of every candidate is the infectious person with the highest probability
+        order = np.lexsort((-probabilities, pairs[:, 1]))
+        sorted_candidates = pairs[order, 1]
+        is_first = np.concatenate([[True], sorted_candidates[1:] != sorted_candidates[:-1]])
+        best_infectors = infectors[order[is_first]]
+
+        # infect the people and log the transmissions
+        infected = np.random.random(candidates.size) < infection_probabilities
+        infectees = susceptible[candidates[infected]]
+        if infectees.size == 0:
+            return
+        self.population.infect_many(infectees, self.timestep)
+        self.transmissions.extend(
+            self.timestep,
+            best_infectors[infected],
+            infectees,
+            susceptible_positions[candidates[infected], 0],
+            susceptible_positions[candidates[infected], 1],
+        )
+
+    def get_n_substeps(self, dt: float) -> int:
+        """
+        Returns the number of physics substeps for a logical timestep of dt seconds: at least the configured substeps,
+        enough substeps to stay below max_physics_dt and (in the adaptive mode) enough substeps so that the fastest
+        person moves at most its collision radius per substep (so that nobody tunnels through a wall or another person).
+        """
+        n_substeps = self.substeps
+        if self.max_physics_dt is not None:
+            n_substeps = max(n_substeps, math.ceil(dt / self.max_physics_dt))
+        if self.adaptive_substeps:
+            max_speed = float(np.sqrt(np.max(np.sum(self.population.get_velocities() ** 2, axis=1))))
+            if max_speed > 0:
+                n_substeps = max(
+                    n_substeps, math.ceil(max_speed * dt / self.collision_radius)
+                )
+        return n_substeps
+
+    def step_physics(self, dt: float) -> None:
+        """
+        Advances the physics simulation by dt seconds in one or more substeps of equal length (see get_n_substeps),
+        so that the physics don't get coarser with a higher speedup_factor. With the "numpy" physics_backend,
+        the particle engine is stepped as well and all new contacts between people are handled in bulk.
+        """
+        n_substeps = self.get_n_substeps(dt)
+        for _ in range(n_substeps):
+            self.world.step(dt / n_substeps)
+            if self.engine is not None:
+                self.engine.step(dt / n_substeps)
+                if self.infection_mode == "contact":
+                    self.handle_contacts(self.engine.new_contacts)
+
+    def handle_contacts(self, contacts: np.ndarray) -> None:
+        """
+        Handles the new contacts (an (m, 2) array of person indices) that the particle engine found in bulk.
+        """
+        if self.profiler is not None:
+            self.profiler.count_collisions(len(contacts))
+
+        # only contacts between an infectious and a susceptible person can lead to a transmission
+        # (they are handled one after the other, so that every person can only be infected once)
+        status_a = self.population.status[contacts[:, 0]]
+        status_b = self.population.status[contacts[:, 1]]
+        candidates = ((status_a == INFECTIOUS) & (status_b == SUSCEPTIBLE)) | (
+            (status_b == INFECTIOUS) & (status_a == SUSCEPTIBLE)
+        )
+        for index_a, index_b in contacts[candidates].tolist():
+            self.transmit(index_a, index_b)
+
+    def get_config(self, **run_config) -> Dict:
+        """
+        Returns the parameters of the simulator (and the given run parameters) as a dictionary.
+        """
+        config = {
+            "n_people": self.n_people,
+            "infection_prob": self.infection_prob,
+            "avg_incubation_time": self.avg_incubation_time,
+            "avg_infectious_time": self.avg_infectious_time,
+            "dwell_distribution": self.dwell_distribution,
+            "dwell_shape": self.dwell_shape,
+            "physics_backend": self.physics_backend,
+            "infection_mode": self.infection_mode,
+            "infection_radius": self.infection_radius,
+            "infection_every": self.infection_every,
+            "infection_falloff": self.infection_falloff,
+            "physics_threads": self.physics_threads,
+            "broadphase": self.broadphase,
+            "solver_iterations": self.solver_iterations,
+            "max_physics_dt": self.max_physics_dt,
+            "substeps": self.substeps,
+            "adaptive_substeps": self.adaptive_substeps,
+            "FPS": self.FPS,
+            "headless": self.headless,
+        }
+        config.update(run_config)
+        return config
+
     def get_status_counts(self) -> Tuple[int, int, int, int]:
         """
         Returns a 4-tuple with counts of how many people there are in each of the 4 stages
         (susceptible, infected, infectious and removed) of our model.
         """
-        status_list = [person.status for person in self.people]
-        susceptible_count = 0
-        infected_count = 0
-        infectious_count = 0
-        removed_count = 0
-
-        for status in status_list:
-            if status == "susceptible":
-                susceptible_count += 1
-            elif status == "infected":
-                infected_count += 1
-            elif status == "infectious":
-                infectious_count += 1
-            else:
-                removed_count += 1
-        return susceptible_count, infected_count, infectious_count, removed_count
+        return self.population.get_status_counts()
 
     def run(
         self,
@@ -200,115 +449,425 @@ class CovidSim:
         speedup_factor: int = 1,
         max_timestep: int = 3000,
         return_data: bool = False,
-    ) -> Tuple[List[int], List[int], List[int], List[int], List[pymunk.vec2d.Vec2d]] or None:
+        record_path: Optional[str] = None,
+        record_every: int = 1,
+        video_fps: Optional[int] = None,
+        status_every: int = 1,
+        status_changes_only: bool = False,
+        telemetry_dir: Optional[str] = None,
+        telemetry_chunk_size: int = 4096,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_every: int = 10_000,
+        profile: bool = False,
+        profile_every: Optional[int] = 1_000,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray] or None:
         """
-        Runs the simulation until it is stopped. This method sets up the background and visual (pygame) of the simulation and also
+        Runs the simulation until it is stopped. This method sets up the background and visual (pygame) of the simulation
+        (unless the simulator is headless) and also
         adds people and a train to the world. It defines a custom collision handler for handling infection spread
         and infects a few (3) people to start the epidemic. The method also handles mouse and keyboard events,
         updates the velocity of people, and renders the map and all simulated objects.
         It saves the status counts for all people and stops the simulation if the maximum given simulation time is reached.
         The method also has the option to return the collected data for plotting.
+        If a record_path is given, every record_every-th frame is exported to a video file (e.g. "run.mp4", encoded by ffmpeg)
+        or to a directory with a numbered image sequence. In headless mode, the frames are rendered offscreen.
+        The video plays with video_fps frames per second (default: the simulator's FPS).
+        The status counts are recorded every status_every timesteps into a preallocated array (self.status_counts)
+        and the returned count arrays are views of its columns. If status_changes_only is True, a row is only recorded if
+        the counts changed. The timesteps of all recorded rows are saved in self.status_timesteps.
+        The returned transmission events (see TRANSMISSION_DTYPE) include the initially infected people (with infector -1).
+        If a telemetry_dir is given, the status counts and transmission events are streamed to append-only files
+        in that directory (in chunks of telemetry_chunk_size rows) instead of being kept in memory, so the memory usage
+        stays flat for very long runs. The returned data is then memory-mapped from these files (see telemetry.open_run).
+        If a checkpoint_path is given, a checkpoint of the complete state of the run is saved there every checkpoint_every
+        timesteps, so that the run can be continued later (see load_checkpoint and resume).
+        If profile is True, the time of every phase of the loop and the collision callbacks are measured (see RunProfiler):
+        a summary is printed every profile_every timesteps (None: never) and the final report is returned as an additional
+        element after the data (and saved in self.profile_report).
         """
+        if status_every < 1:
+            raise Exception("Value Error: status_every has to be at least 1.")
+        if record_every < 1:
+            raise Exception("Value Error: record_every has to be at least 1.")
+        if telemetry_chunk_size < 1:
+            raise Exception("Value Error: telemetry_chunk_size has to be at least 1.")
+
+        # pick the fastest physics settings (before seeding, so that the tuning doesn't change the run)
+        self.speedup_factor = speedup_factor
+        if self.auto_tune_physics and not self.physics_tuned:
+            self.tune_physics()
+
         # setup the new run
         random.seed(seed)
+        np.random.seed(seed)
         self.running = True
-        self.speedup_factor = speedup_factor
-        self.status_counts = []  # reset all status counts
+        self.max_timestep = max_timestep
+        self.record_every = record_every
+        self.status_every = status_every
+        self.status_changes_only = status_changes_only
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.profiler = None
+        self.profile_report = None
 
-        # create the pygame-screen
-        self.screen = pg.display.set_mode((self.screen_size, self.screen_size))
-        self.clock = pg.time.Clock()
-
-        # add the logo and caption for the window
-        logo = pg.image.load("images/virus_logo.png")
-        pg.display.set_icon(logo)
-        pg.display.set_caption("COVID19-Sim")
+        # preallocate the arrays for the status counts (or stream them to the telemetry files)
+        self.status_counts = self.status_timesteps = None
+        self.telemetry = None
+        if telemetry_dir is not None:
+            self.telemetry = TelemetryWriter(
+                telemetry_dir,
+                config=self.get_config(
+                    seed=seed, speedup_factor=speedup_factor, max_timestep=max_timestep
+                ),
+                chunk_size=telemetry_chunk_size,
+            )
+        n_records = max_timestep // status_every if self.telemetry is None else 0
+        self.status_buffer = np.zeros((n_records, 4), dtype=np.int64)
+        self.status_timestep_buffer = np.zeros(n_records, dtype=np.int64)
+        self.n_recorded = 0
+        self.last_recorded_counts = None
+        self.transmissions.clear()  # reset the transmissions of the previous run
+        self.timestep = 0
 
         # create the particle simulation
         self.create_world()
 
-        # add people to the simulation
-        self.people = [
-            Person(
-                world=self.world,
-                pathfinder=self.pf,
-                init_min=0,
-                init_max=self.screen_size,
-                collision_radius=2,
+        # create the particle engine for the people (the pymunk world then only simulates the train)
+        self.engine = None
+        if self.physics_backend == "numpy":
+            self.engine = ParticleEngine(
+                self.pf.world_array, self.n_people, radius=self.collision_radius
             )
-            for i in range(self.n_people)
-        ]
+
+        # add people to the simulation
+        self.population = Population(
+            world=self.world,
+            pathfinder=self.pf,
+            n_people=self.n_people,
+            init_min=0,
+            init_max=self.screen_size,
+            avg_incubation_time=self.avg_incubation_time,
+            avg_infectious_time=self.avg_infectious_time,
+            dwell_distribution=self.dwell_distribution,
+            dwell_shape=self.dwell_shape,
+            collision_radius=self.collision_radius,
+            engine=self.engine,
+        )
+        self.people = self.population.people
+
+        # measure the phases of the loop and count the collision callbacks
+        if profile:
+            self.profiler = RunProfiler(self.collision_begin, report_every=profile_every)
 
         # define custom collision handler that handles infection spreading
-        self.handler = self.world.add_default_collision_handler()
-        self.handler.begin = (
-            self.collision_begin
-        )  # each time two objects collide the custom collision_begin method is called for handling infection spread
+        self.install_collision_handler()
+
+        # the grid for finding the susceptible people near infectious people (in the "distance" infection_mode)
+        self.infection_grid = None
+        if self.infection_mode == "distance":
+            self.infection_grid = SpatialHashGrid(self.infection_radius, self.width, self.height)
 
         # infect 3 random persons to start the epidemic
         for _ in range(3):
-            random.choice(self.people).infect()
+            index = random.randrange(self.n_people)
+            if self.population.status[index] == SUSCEPTIBLE:
+                self.population.infect(index, self.timestep)
+                x, y = self.population.get_position(index)
+                self.transmissions.append(self.timestep, -1, index, x, y)
 
         # add a train to the simulation
         self.train = Train(world=self.world, start_pos=(70, 5), wall_thickness=3)
 
-        timestep = 0
+        # create the pygame-screen (or the offscreen surface for recording)
+        self.setup_screen(record_path is not None)
+
+        # start the export of the rendered frames
+        self.frame_writer = None
+        if record_path is not None:
+            self.frame_writer = FrameWriter(
+                record_path,
+                frame_size=(self.screen_size, self.screen_size),
+                fps=video_fps or self.FPS,
+            )
+
+        return self._run_loop(return_data)
+
+    def setup_screen(self, offscreen_rendering: bool = False) -> None:
+        """
+        Creates the pygame-screen and the renderer (that loads the images and prebakes the background).
+        In headless mode, a screen is only created if offscreen_rendering is True (e.g. for recording a video).
+        """
+        if not self.headless:
+            # create the pygame-screen
+            self.screen = pg.display.set_mode((self.screen_size, self.screen_size))
+            self.clock = pg.time.Clock()
+
+            # add the logo and caption for the window
+            logo = pg.image.load("images/virus_logo.png")
+            pg.display.set_icon(logo)
+            pg.display.set_caption("COVID19-Sim")
+
+            # load the images and prebake the background
+            self.renderer = Renderer(self, self.screen)
+            pg.display.flip()
+        elif offscreen_rendering:
+            # render the frames on an offscreen surface
+            self.screen = pg.Surface((self.screen_size, self.screen_size))
+            self.renderer = Renderer(self, self.screen)
+
+    def _run_loop(
+        self, return_data: bool
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray] or None:
+        """
+        Runs the main loop of the simulation (until self.max_timestep is reached or the simulation is stopped)
+        and returns the collected data if return_data is True.
+        """
+        if self.profiler is not None:
+            self.profiler.start()
+
         while self.running:
 
-            self.clock.tick(self.FPS)  # update pygame time
-            self.world.step(
+            if not self.headless:
+                self.clock.tick(self.FPS)  # update pygame time
+            if self.profiler is not None:
+                self.profiler.start_step()
+            self.timestep += 1
+            self.step_physics(
                 self.speedup_factor / self.FPS
             )  # keeps rendered steps/s consistent (independent of self.FPS)
-            timestep += 1
+            if self.profiler is not None:
+                self.profiler.lap(WORLD_STEP)
 
             # handle mouse and keyboard events (e.g. closing the window)
-            self.events()
+            if not self.headless:
+                self.events()
+                if self.profiler is not None:
+                    self.profiler.lap(EVENTS)
 
             # update the velocity of all people according to their goal-path
-            for person in self.people:
-                person.update_velocity(pg.time.get_ticks())
+            self.population.update_velocities(self.pf)
+            if self.profiler is not None:
+                self.profiler.lap(VELOCITIES)
 
             # update the trains state and the infection-status updates for all people
             self.update()
+            if self.profiler is not None:
+                self.profiler.lap(UPDATE)
 
             # render the map and all simulated objects
-            if self.running:
+            if self.running and not self.headless:
                 self.draw()
+                if self.profiler is not None:
+                    self.profiler.lap(DRAW)
+
+            # export the current frame
+            if (
+                self.frame_writer is not None
+                and self.running
+                and self.timestep % self.record_every == 0
+            ):
+                if self.headless:
+                    self.renderer.draw(self)
+                self.frame_writer.write(self.screen)
+                if self.profiler is not None:
+                    self.profiler.lap(EXPORT)
 
             # save status counts for all people
-            (
-                susceptible_count,
-                infected_count,
-                infectious_count,
-                removed_count,
-            ) = self.get_status_counts()
-            self.status_counts.append(
-                (susceptible_count, infected_count, infectious_count, removed_count)
-            )
+            self.record_status_counts()
+            if self.profiler is not None:
+                self.profiler.lap(RECORD)
+
+            # save a checkpoint
+            if (
+                self.checkpoint_path is not None
+                and self.timestep % self.checkpoint_every == 0
+            ):
+                self.save_checkpoint(self.checkpoint_path)
+                if self.profiler is not None:
+                    self.profiler.lap(CHECKPOINT)
+
+            if self.profiler is not None:
+                self.profiler.end_step(self.timestep, self.max_timestep)
 
             # stop the simulation if the maximum given simulation time is reached
-            if timestep >= max_timestep:
+            if self.timestep >= self.max_timestep:
                 break
 
-        pg.quit()
+        if self.frame_writer is not None:
+            self.frame_writer.close()
+            self.frame_writer = None
+
+        if not self.headless:
+            pg.quit()
+
+        if self.telemetry is not None:
+            # write the last chunk and map the complete run from the telemetry files
+            # (every metrics row consists of 5 int64 values: the timestep and the 4 status counts)
+            if len(self.transmissions) > 0:
+                self.telemetry.write_events(self.transmissions.events)
+                self.transmissions.clear()
+            self.telemetry.close()
+            _, metrics, transmissions = open_run(self.telemetry.run_dir)
+            metrics = metrics.view(np.int64).reshape(-1, 5)
+            self.status_counts = metrics[:, 1:]
+            self.status_timesteps = metrics[:, 0]
+        else:
+            # keep only the recorded rows (views without copying)
+            self.status_counts = self.status_buffer[: self.n_recorded]
+            self.status_timesteps = self.status_timestep_buffer[: self.n_recorded]
+            transmissions = self.transmissions.events
+
+        # create the final report of the profiler
+        if self.profiler is not None:
+            self.profile_report = self.profiler.get_report()
 
         # return the collected data
         if return_data:
-            susceptible_counts = [
-                status_tuple[0] for status_tuple in self.status_counts
-            ]
-            infected_counts = [status_tuple[1] for status_tuple in self.status_counts]
-            infectious_counts = [status_tuple[2] for status_tuple in self.status_counts]
-            removed_counts = [status_tuple[3] for status_tuple in self.status_counts]
+            data = (
+                self.status_counts[:, 0],
+                self.status_counts[:, 1],
+                self.status_counts[:, 2],
+                self.status_counts[:, 3],
+                transmissions,
+            )
+            if self.profiler is not None:
+                return data + (self.profile_report,)
+            return data
+
+    def record_status_counts(self) -> None:
+        """
+        Records the current status counts (in the preallocated arrays or the telemetry files)
+        and streams new transmission events to the telemetry files.
+        """
+        counts = self.population.status_counts
+        if self.timestep % self.status_every == 0 and not (
+            self.status_changes_only
+            and self.last_recorded_counts is not None
+            and np.array_equal(counts, self.last_recorded_counts)
+        ):
+            if self.telemetry is not None:
+                self.telemetry.write_metrics(self.timestep, counts)
+            elif self.n_recorded < len(self.status_buffer):
+                self.status_buffer[self.n_recorded] = counts
+                self.status_timestep_buffer[self.n_recorded] = self.timestep
+                self.n_recorded += 1
+            self.last_recorded_counts = counts.copy()
 
-            return (
-                susceptible_counts,
-                infected_counts,
-                infectious_counts,
-                removed_counts,
+        # stream the new transmission events to the telemetry files
+        if self.telemetry is not None and len(self.transmissions) > 0:
+            self.telemetry.write_events(self.transmissions.events)
+            self.transmissions.clear()
 
-                self.collision_points
-            )
+    def __getstate__(self) -> Dict:
+        """
+        Returns the state of the simulator for pickling a checkpoint.
+        The pathfinder (which is large and can be reloaded), the pygame objects and the frame export are not part of a checkpoint,
+        but the states of both random number generators are, so that a resumed run continues with the same random numbers.
+        """
+        state = self.__dict__.copy()
+        for key in ["pf", "screen", "clock", "renderer", "frame_writer", "handler"]:
+            state[key] = None
+        # the returned data is recreated at the end of the run (and might be mapped from the telemetry files)
+        state["status_counts"] = state["status_timesteps"] = None
+        state["random_state"] = random.getstate()
+        state["np_random_state"] = np.random.get_state()
+        return state
+
+    def attach(self, pathfinder) -> None:
+        """
+        Attaches the pathfinder (to the simulator and all people) and the collision handler after loading a checkpoint.
+        """
+        self.pf = pathfinder
+        for person in self.people:
+            person.pf = pathfinder
+        self.install_collision_handler()
+
+        # the broadphase is not part of a pickled space
+        self.configure_space(self.world)
+
+    def install_collision_handler(self) -> None:
+        """
+        Installs the custom collision handler that handles infection spreading in the "contact" infection_mode:
+        each time two people collide, the collision_begin method is called (through the profiler, if the run is profiled).
+        Collisions with walls and the train have different collision types, so they are handled by pymunk alone.
+        """
+        self.handler = self.world.add_collision_handler(
+            PERSON_COLLISION_TYPE, PERSON_COLLISION_TYPE
+        )
+        if self.infection_mode != "contact":
+            return
+        self.handler.begin = self.collision_begin
+        if self.profiler is not None:
+            self.profiler.callback = self.collision_begin
+            self.handler.begin = self.profiler.collision_begin
+
+    def save_checkpoint(self, path: str) -> None:
+        """
+        Saves a checkpoint of the current run: the pymunk space (all bodies, velocities and the train's state),
+        the population (status, targets, timers and schedules), the recorded data, the timestep and the states of
+        both random number generators. The running simulation itself is not changed, so a run takes the same course
+        with and without checkpoints.
+        (pymunk rebuilds its spatial index and forgets the current contacts when a space is loaded, so a resumed run
+        with the "pymunk" physics_backend continues from the same state but not bit-for-bit like the original run.
+        With the "numpy" physics_backend, it continues bit-for-bit.)
+        """
+        # make sure that everything until this timestep is on the disk
+        if self.telemetry is not None:
+            self.telemetry.flush()
+        checkpoint = pickle.dumps(self, protocol=pickle.HIGHEST_PROTOCOL)
+
+        # write to a temporary file first, so that a crash never leaves a broken checkpoint behind
+        with open(path + ".tmp", "wb") as checkpoint_file:
+            checkpoint_file.write(checkpoint)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load_checkpoint(path: str, pathfinder) -> CovidSim:
+        """
+        Loads a simulator from a checkpoint and attaches the given pathfinder to it.
+        Call resume() on the returned simulator to continue the run.
+        """
+        with open(path, "rb") as checkpoint_file:
+            sim = pickle.load(checkpoint_file)
+        sim.attach(pathfinder)
+        return sim
+
+    def resume(
+        self,
+        return_data: bool = False,
+        max_timestep: Optional[int] = None,
+        checkpoint_path: Optional[str] = None,
+        checkpoint_every: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray] or None:
+        """
+        Continues a run that was loaded with load_checkpoint or stopped by reaching its maximum timestep
+        (the exporting of frames is not continued).
+        The maximum timestep and the checkpointing can be changed, otherwise the settings of the original run are used.
+        """
+        # restore the random number generators (only once after loading the checkpoint)
+        if "random_state" in self.__dict__:
+            random.setstate(self.__dict__.pop("random_state"))
+            np.random.set_state(self.__dict__.pop("np_random_state"))
+
+        self.running = True
+        if max_timestep is not None:
+            self.max_timestep = max_timestep
+        if checkpoint_path is not None:
+            self.checkpoint_path = checkpoint_path
+            self.checkpoint_every = checkpoint_every or self.checkpoint_every
+
+        # the telemetry files are closed at the end of every run
+        if self.telemetry is not None:
+            self.telemetry.reopen()
+
+        # the status buffer might have to grow if the maximum timestep was increased
+        n_records = self.max_timestep // self.status_every if self.telemetry is None else 0
+        if n_records > len(self.status_buffer):
+            self.status_buffer = np.resize(self.status_buffer, (n_records, 4))
+            self.status_timestep_buffer = np.resize(self.status_timestep_buffer, n_records)
+
+        self.setup_screen()
+        return self._run_loop(return_data)
 
     def events(self) -> None:
         """
@@ -333,56 +892,120 @@ class CovidSim:
         Updates the state (i.e. velocity updates, color updates, ...) of the train and all people (including the infection status).
         """
 
+        sim_time = self.get_sim_time()
+
         # update the train's state
-        self.train.update_state(world=self.world, timestep=pg.time.get_ticks())
+        self.train.update_state(world=self.world, timestep=sim_time)
 
         # update the targets for all people (which building they want to visit)
-        for person in self.people:
-            person.update_target(timestep=pg.time.get_ticks())
+        self.population.update_targets(timestep=sim_time)
 
         # update the infection status for all people
-        for person in self.people:
-            person.update_infection_status(
-                self.avg_incubation_time,
-                self.avg_infectious_time,
-                timestep=pg.time.get_ticks(),
-            )
+        self.population.update_infection_status(timestep=self.timestep)
+
+        # spread the infection to the susceptible people near infectious people
+        if self.infection_mode == "distance" and self.timestep % self.infection_every == 0:
+            self.spread_infections()
+
+    def get_sim_time(self) -> int:
+        """
+        Returns the simulation time in milliseconds, derived from the integer simulation timestep.
+        At the nominal FPS this matches the pygame ticks that the train cycle and target changes were tuned for,
+        but it doesn't depend on how fast the host actually runs the loop (which makes runs reproducible).
+        """
+        return self.timestep * 1000 // self.FPS
 
     def draw(self) -> None:
         """
         Renders the simulated world on the pygame screen.
         If the simulator is in debug-mode, it also draws dots (helpful for aligning walls etc.)
-        and the walls of buildings.
+        and the walls of buildings (both are prebaked into the renderer's background).
+        Only the areas of the screen that changed since the last frame are updated.
         """
-        # draw the background image of Golm
-        golm_img = pg.image.load("images/golm_map.png")
-        golm_img = pg.transform.scale(golm_img, (self.screen_size, self.screen_size))
-        self.screen.blit(golm_img, (0, 0))
+        dirty_rects = self.renderer.draw(self)
+        pg.display.update(dirty_rects)
 
-        # draw the train
-        self.train.draw(self.screen)
+    def configure_space(
+        self,
+        space: pymunk.Space,
+        threads: Optional[int] = None,
+        broadphase: Optional[str] = None,
+    ) -> None:
+        """
+        Applies the physics settings (by default the simulator's physics_threads, broadphase and solver_iterations)
+        to the given pymunk space. The spatial hash uses cells with the diameter of a person and at least
+        10 cells per person.
+        """
+        threads = threads or self.physics_threads
+        broadphase = broadphase or self.broadphase
 
-        # draw all people
-        for person in self.people:
-            person.draw(self.screen)
-
-        # draw the buildings
-        if self.draw_walls:
-            for building in self.buildings:
-                for wall in building:
-                    wall.draw(self.screen)
-
-        # draw a grid of dots for testing & debugging
-        if self.draw_dots:
-            for i in range(80):
-                for j in range(80):
-                    if i % 10 == 0 and j % 10 == 0:
-                        pg.draw.circle(self.screen, RED, (i * 10, j * 10), 2)
-                    else:
-                        pg.draw.circle(self.screen, LIGHT_GREY, (i * 10, j * 10), 2)
-
-        # update the entire screen
-        pg.display.flip()
+        space.iterations = self.solver_iterations
+        if space.threaded:
+            space.threads = threads
+        if broadphase == "spatial_hash":
+            space.use_spatial_hash(
+                dim=2 * self.collision_radius, count=max(10 * self.n_people, 1_000)
+            )
+
+    def tune_physics(self, n_steps: int = 100) -> List[Dict]:
+        """
+        Benchmarks all combinations of thread counts (1 and 2, pymunk doesn't use more threads) and broadphases
+        by stepping copies of a test world with n_steps steps, and keeps the fastest combination for all following runs.
+        Returns the steps per second of all combinations. (Only the "pymunk" physics_backend can be tuned.)
+        """
+        if self.physics_backend != "pymunk":
+            raise Exception(
+                "Value Error: Only the pymunk space can be tuned (use physics_backend='pymunk')."
+            )
+
+        # create a test world with the same number of people
+        self.create_world()
+        Population(
+            world=self.world,
+            pathfinder=self.pf,
+            n_people=self.n_people,
+            init_min=0,
+            init_max=self.screen_size,
+            avg_incubation_time=self.avg_incubation_time,
+            avg_infectious_time=self.avg_infectious_time,
+            collision_radius=self.collision_radius,
+        )
+        Train(world=self.world, start_pos=(70, 5), wall_thickness=3)
+        test_shapes = list(self.world.shapes)
+
+        results = []
+        for threads in [1, 2]:
+            for broadphase in ["bbtree", "spatial_hash"]:
+                # a space can only be made threaded when it is created, so every combination gets a new space
+                # with copies of all bodies and shapes of the test world (the bodies are shared by their shapes)
+                space = pymunk.Space(threaded=threads > 1)
+                self.configure_space(space, threads, broadphase)
+                shapes = copy.deepcopy(test_shapes)
+                bodies = list({id(shape.body): shape.body for shape in shapes}.values())
+                space.add(*bodies, *shapes)
+
+                start_time = time.perf_counter()
+                for _ in range(n_steps):
+                    space.step(self.speedup_factor / self.FPS)
+                elapsed_time = time.perf_counter() - start_time
+                results.append(
+                    {
+                        "threads": threads,
+                        "broadphase": broadphase,
+                        "steps_per_s": n_steps / elapsed_time,
+                    }
+                )
+
+        # keep the fastest settings
+        fastest = max(results, key=lambda result: result["steps_per_s"])
+        self.physics_threads = fastest["threads"]
+        self.broadphase = fastest["broadphase"]
+        self.physics_tuned = True
+        print(
+            f"using {self.physics_threads} physics thread(s) and the {self.broadphase} broadphase "
+            f"({fastest['steps_per_s']:.1f} steps/s)"
+        )
+        return results
 
     def _create_tile(self, origin_pos: Tuple[int, int], tile_type: str) -> List[Wall]:
         """
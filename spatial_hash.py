@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import numpy as np
+
+from typing import Tuple, List, Optional, Union
+
+
+# half of the 3x3 neighborhood of a cell: (x_delta, y_delta) offsets of the cells that are searched for pairs
+# (the other half is covered by the neighboring cells, so every pair is only found once)
+HALF_NEIGHBORHOOD = ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+# the complete 3x3 neighborhood of a cell (for queries with points that are not part of the grid)
+FULL_NEIGHBORHOOD = tuple((x_delta, y_delta) for x_delta in (-1, 0, 1) for y_delta in (-1, 0, 1))
+
+
+class SpatialHashGrid:
+    """
+    A uniform grid that sorts points into square cells, so that all pairs of points within a maximum distance
+    can be found by only comparing points in neighboring cells (instead of all n^2 pairs).
+    The grid is rebuilt from scratch with every build call (a counting sort by cell id), which is cheap enough
+    to do once per timestep and keeps all operations vectorized.
+    """
+
+    def __init__(self, cell_size: float, width: int, height: int) -> None:
+        """
+        Initializes a grid with square cells of the given size that covers the area (0, 0) to (width, height).
+        Points outside of the area are sorted into the border cells.
+        """
+        if cell_size <= 0:
+            raise Exception("Value Error: The cell size of the grid has to be positive.")
+
+        self.cell_size = cell_size
+        self.n_cols = int(np.ceil(width / cell_size))
+        self.n_rows = int(np.ceil(height / cell_size))
+        self.n_cells = self.n_cols * self.n_rows
+
+        # the sorted grid (set by build)
+        self.order = None  # point indices sorted by cell id
+        self.cell_start = None  # index of a cell's first point in order
+        self.cell_end = None  # index after a cell's last point in order
+        self.point_cols = None  # cell column of every point (in sorted order)
+        self.point_rows = None  # cell row of every point (in sorted order)
+
+    def get_cells(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns the cell columns and rows of the given (n, 2) positions."""
+        cells = np.floor(positions / self.cell_size).astype(np.int64)
+        cols = np.clip(cells[:, 0], 0, self.n_cols - 1)
+        rows = np.clip(cells[:, 1], 0, self.n_rows - 1)
+        return cols, rows
+
+    def build(self, positions: np.ndarray) -> None:
+        """Sorts the points with the given (n, 2) positions into the grid."""
+        cols, rows = self.get_cells(positions)
+        cell_ids = rows * self.n_cols + cols
+
+        # counting sort by cell id
+        self.order = np.argsort(cell_ids, kind="stable")
+        counts = np.bincount(cell_ids, minlength=self.n_cells)
+        self.cell_end = np.cumsum(counts)
+        self.cell_start = self.cell_end - counts
+        self.point_cols = cols[self.order]
+        self.point_rows = rows[self.order]
+
+    def query_pairs(self, positions: np.ndarray, max_distance: float) -> np.ndarray:
+        """
+        Returns all pairs of points that are at most max_distance apart as an (m, 2) array of point indices
+        (with the smaller index first, sorted by the first and then the second index).
+        The grid has to be built with the same positions and max_distance can't be larger than the cell size.
+        """
+        if max_distance > self.cell_size:
+            raise Exception(
+                "Value Error: The maximum distance can't be larger than the cell size of the grid."
+            )
+
+        n_points = len(self.order)
+        sorted_indices = np.arange(n_points)
+        first_parts, second_parts = [], []
+
+        for x_delta, y_delta in HALF_NEIGHBORHOOD:
+            neighbor_cols = self.point_cols + x_delta
+            neighbor_rows = self.point_rows + y_delta
+            valid = (
+                (neighbor_cols >= 0)
+                & (neighbor_cols < self.n_cols)
+                & (neighbor_rows < self.n_rows)
+            )
+            points = sorted_indices[valid]
+            neighbor_cells = neighbor_rows[valid] * self.n_cols + neighbor_cols[valid]
+            starts = self.cell_start[neighbor_cells]
+            ends = self.cell_end[neighbor_cells]
+            if x_delta == 0 and y_delta == 0:
+                starts = points + 1  # pairs within the same cell are only counted once
+            counts = np.maximum(ends - starts, 0)
+
+            # expand every point to the range of candidate points in the neighboring cell
+            n_candidates = counts.sum()
+            if n_candidates == 0:
+                continue
+            first = np.repeat(points, counts)
+            offsets = np.arange(n_candidates) - np.repeat(np.cumsum(counts) - counts, counts)
+            second = np.repeat(starts, counts) + offsets
+            first_parts.append(first)
+            second_parts.append(second)
+
+        if not first_parts:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        # keep the candidate pairs that are close enough
+        first = self.order[np.concatenate(first_parts)]
+        second = self.order[np.concatenate(second_parts)]
+        distances_squared = np.sum((positions[first] - positions[second]) ** 2, axis=1)
+        close = distances_squared <= max_distance**2
+        first, second = first[close], second[close]
+
+        # sort the pairs (so that the result doesn't depend on the order of the grid cells)
+        keys = np.sort(np.minimum(first, second) * n_points + np.maximum(first, second))
+        return np.stack([keys // n_points, keys % n_points], axis=1)
+
+    def query_neighbors(
+        self, query_positions: np.ndarray, positions: np.ndarray, max_distance: float
+    ) -> np.ndarray:
+        """
+        Returns all pairs of a query point and a grid point that are at most max_distance apart as an (m, 2) array
+        (the index of the query point and the index of the grid point, sorted by both indices).
+        The grid has to be built with the given positions and max_distance can't be larger than the cell size.
+        The cost only depends on the number of query points and the number of grid points in their neighborhoods.
+        """
+        if max_distance > self.cell_size:
+            raise Exception(
+                "Value Error: The maximum distance can't be larger than the cell size of the grid."
+            )
+
+        query_cols, query_rows = self.get_cells(query_positions)
+        query_indices = np.arange(len(query_positions))
+        first_parts, second_parts = [], []
+
+        for x_delta, y_delta in FULL_NEIGHBORHOOD:
+            neighbor_cols = query_cols + x_delta
+            neighbor_rows = query_rows + y_delta
+            valid = (
+                (neighbor_cols >= 0)
+                & (neighbor_cols < self.n_cols)
+                & (neighbor_rows >= 0)
+                & (neighbor_rows < self.n_rows)
+            )
+            queries = query_indices[valid]
+            neighbor_cells = neighbor_rows[valid] * self.n_cols + neighbor_cols[valid]
+            starts = self.cell_start[neighbor_cells]
+            counts = self.cell_end[neighbor_cells] - starts
+
+            # expand every query point to the range of points in the neighboring cell
+            n_candidates = counts.sum()
+            if n_candidates == 0:
+                continue
+            offsets = np.arange(n_candidates) - np.repeat(np.cumsum(counts) - counts, counts)
+            first_parts.append(np.repeat(queries, counts))
+            second_parts.append(np.repeat(starts, counts) + offsets)
+
+        if not first_parts:
+            return np.zeros((0, 2), dtype=np.int64)
+
+        # keep the candidate pairs that are close enough
+        first = np.concatenate(first_parts)
+        second = self.order[np.concatenate(second_parts)]
+        distances_squared = np.sum((query_positions[first] - positions[second]) ** 2, axis=1)
+        close = distances_squared <= max_distance**2
+        pairs = np.stack([first[close], second[close]], axis=1)
+        return pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
@@ -0,0 +1,203 @@
+from __future__ import annotations
+
+import numpy as np
+import os
+import time
+
+from simulator import CovidSim
+from worker_pool import simulation_pool, get_worker_sim, check_sim_kwargs
+
+from concurrent.futures import as_completed
+from itertools import product
+from typing import Tuple, List, Optional, Union, Dict
+
+
+# simulator parameters that can be varied between the cells of a sweep
+SWEEP_PARAMETERS = ("n_people", "infection_prob", "avg_incubation_time", "avg_infectious_time")
+INTEGER_PARAMETERS = ("n_people", "avg_incubation_time", "avg_infectious_time")
+
+# one row per run of a sweep (a cell of the sweep and a seed)
+SWEEP_RESULT_DTYPE = np.dtype(
+    [
+        ("config_index", np.int32),
+        ("seed", np.int64),
+        ("n_people", np.int64),
+        ("infection_prob", np.float64),
+        ("avg_incubation_time", np.int64),
+        ("avg_infectious_time", np.int64),
+        ("final_susceptible", np.int64),
+        ("final_infected", np.int64),
+        ("final_infectious", np.int64),
+        ("final_removed", np.int64),
+        ("peak_infectious", np.int64),
+        ("peak_timestep", np.int64),
+        ("attack_rate", np.float64),
+        ("n_transmissions", np.int64),
+        ("runtime_s", np.float64),
+    ]
+)
+
+def grid_configs(**parameter_values) -> List[Dict]:
+    """
+    Returns the configurations of a grid sweep: every combination of the given values of the sweep parameters,
+    e.g. grid_configs(n_people=[200, 500], infection_prob=[0.1, 0.3]) returns 4 configurations.
+    """
+    _check_parameters(parameter_values)
+    names = list(parameter_values)
+    return [
+        dict(zip(names, values))
+        for values in product(*(parameter_values[name] for name in names))
+    ]
+
+
+def latin_hypercube_configs(
+    n_samples: int, parameter_ranges: Dict[str, Tuple[float, float]], seed: int = 0
+) -> List[Dict]:
+    """
+    Returns n_samples configurations that are sampled from the given (low, high) ranges of the sweep parameters
+    with latin hypercube sampling: the range of every parameter is split into n_samples strata and every stratum
+    is sampled exactly once (the integer parameters are rounded).
+    """
+    _check_parameters(parameter_ranges)
+    rng = np.random.default_rng(seed)
+    configs = [{} for _ in range(n_samples)]
+    for name, (low, high) in parameter_ranges.items():
+        strata = rng.permutation(n_samples)
+        values = low + (strata + rng.random(n_samples)) / n_samples * (high - low)
+        if name in INTEGER_PARAMETERS:
+            values = np.round(values).astype(int)
+        for config, value in zip(configs, values.tolist()):
+            config[name] = value
+    return configs
+
+
+def _check_parameters(parameters: Dict) -> None:
+    """Raises an exception if a parameter can't be varied in a sweep."""
+    for name in parameters:
+        if name not in SWEEP_PARAMETERS:
+            raise Exception(
+                f"Value Error: '{name}' is not a sweep parameter (use one of {', '.join(SWEEP_PARAMETERS)})."
+            )
+
+
+def _run_cell(
+    params: Dict, seed: int, run_kwargs: Dict
+) -> Tuple[np.ndarray, np.ndarray, int, float]:
+    """
+    Runs the worker's simulator with the given sweep parameters and seed.
+    Returns the status counts with shape (n_records, 4), the timesteps at which they were recorded,
+    the number of transmissions and the runtime in seconds.
+    """
+    sim = get_worker_sim()
+    for name, value in params.items():
+        setattr(sim, name, value)
+
+    start_time = time.perf_counter()
+    data = sim.run(seed=seed, return_data=True, **run_kwargs)
+    runtime = time.perf_counter() - start_time
+    return np.stack(data[:4], axis=1), np.array(sim.status_timesteps), len(data[4]), runtime
+
+
+def _fill_row(
+    row: np.void,
+    config_index: int,
+    seed: int,
+    params: Dict,
+    status_counts: np.ndarray,
+    status_timesteps: np.ndarray,
+    n_transmissions: int,
+    runtime: float,
+) -> None:
+    """Writes the parameters and the summary statistics of a run into a row of the results table."""
+    row["config_index"] = config_index
+    row["seed"] = seed
+    for name in SWEEP_PARAMETERS:
+        row[name] = params[name]
+    (
+        row["final_susceptible"],
+        row["final_infected"],
+        row["final_infectious"],
+        row["final_removed"],
+    ) = status_counts[-1]
+    peak_row = np.argmax(status_counts[:, 2])
+    row["peak_infectious"] = status_counts[peak_row, 2]
+    row["peak_timestep"] = status_timesteps[peak_row]
+    row["attack_rate"] = 1 - status_counts[-1, 0] / params["n_people"]
+    row["n_transmissions"] = n_transmissions
+    row["runtime_s"] = runtime
+
+
+def run_sweep(
+    configs: List[Dict],
+    seeds: List[int] = (1,),
+    sim_kwargs: Optional[Dict] = None,
+    n_workers: Optional[int] = None,
+    use_precomputed_heatmaps: bool = True,
+    return_curves: bool = False,
+    **run_kwargs,
+) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+    """
+    Runs every configuration (see grid_configs and latin_hypercube_configs) with every seed as a headless simulation
+    on a pool of n_workers processes (default: one per CPU core). Every worker creates its simulator once and reuses it
+    for all of its runs (see simulation_pool). sim_kwargs are the fixed parameters of CovidSim (the configurations
+    override them) and run_kwargs (e.g. speedup_factor, max_timestep) are passed to CovidSim.run.
+    Returns the results as a columnar table (a structured array with the SWEEP_RESULT_DTYPE and one row per run,
+    ordered by configuration and seed) and, if return_curves is True, the status counts of all runs
+    with shape (runs, steps, 4).
+    (When this is called from a script, the call has to be guarded by `if __name__ == "__main__":`.)
+    """
+    sim_kwargs = dict(sim_kwargs or {})
+    check_sim_kwargs(sim_kwargs)
+    for config in configs:
+        _check_parameters(config)
+        if "n_people" not in config and "n_people" not in sim_kwargs:
+            raise Exception(
+                "Value Error: n_people has to be given in sim_kwargs or in every configuration."
+            )
+    if "n_people" not in sim_kwargs:
+        # every configuration sets its own n_people, so the simulators are only created with a placeholder
+        sim_kwargs["n_people"] = configs[0]["n_people"] if configs else 1
+
+    # the parameters that aren't part of a configuration are taken from a simulator with the fixed parameters
+    fixed_sim = CovidSim(**sim_kwargs, headless=True)
+    fixed_params = {name: getattr(fixed_sim, name) for name in SWEEP_PARAMETERS}
+
+    # one run per configuration and seed
+    cells = [
+        (config_index, {**fixed_params, **config}, seed)
+        for config_index, config in enumerate(configs)
+        for seed in seeds
+    ]
+    results = np.zeros(len(cells), dtype=SWEEP_RESULT_DTYPE)
+    curves = [None] * len(cells)
+
+    if n_workers is None:
+        n_workers = min(len(cells), os.cpu_count() or 1)
+
+    with simulation_pool(sim_kwargs, n_workers, use_precomputed_heatmaps) as executor:
+        # start the largest populations first, so that the workers finish at about the same time
+        order = sorted(range(len(cells)), key=lambda row: -cells[row][1]["n_people"])
+        futures = {
+            executor.submit(_run_cell, cells[row][1], cells[row][2], run_kwargs): row
+            for row in order
+        }
+        for future in as_completed(futures):
+            row = futures[future]
+            status_counts, status_timesteps, n_transmissions, runtime = future.result()
+            config_index, params, seed = cells[row]
+            _fill_row(
+                results[row],
+                config_index,
+                seed,
+                params,
+                status_counts,
+                status_timesteps,
+                n_transmissions,
+                runtime,
+            )
+            if return_curves:
+                curves[row] = status_counts
+
+    if return_curves:
+        return results, np.stack(curves)
+    return results
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import numpy as np
+import json
+import os
+
+from transmission_log import TRANSMISSION_DTYPE
+
+from typing import Tuple, List, Optional, Union, Dict
+
+
+# one row per recorded timestep
+METRICS_DTYPE = np.dtype(
+    [
+        ("timestep", np.int64),
+        ("susceptible", np.int64),
+        ("infected", np.int64),
+        ("infectious", np.int64),
+        ("removed", np.int64),
+    ]
+)
+
+
+class TelemetryWriter:
+    """
+    Streams the per-step status counts and the transmission events of a run to append-only files in a run directory:
+    -> header.json: the configuration of the run and the dtypes of the binary files
+    -> metrics.bin: the status counts as fixed-size rows with the METRICS_DTYPE
+    -> events.bin: the transmission events as fixed-size rows with the TRANSMISSION_DTYPE
+    The metrics are buffered in chunks of chunk_size rows, so the memory usage is bounded,
+    and the files can be memory-mapped with open_run while the run is still in progress.
+    """
+
+    def __init__(self, run_dir: str, config: Dict, chunk_size: int = 4096) -> None:
+        """
+        Creates the run directory, writes the header and opens the binary files.
+        """
+        self.run_dir = run_dir
+        self.config = config
+        self.chunk_size = chunk_size
+        os.makedirs(run_dir, exist_ok=True)
+
+        # buffer for the metrics of the current chunk
+        self.metrics_buffer = np.zeros(chunk_size, dtype=METRICS_DTYPE)
+        self.n_buffered = 0
+        self.n_metrics = 0
+        self.n_events = 0
+
+        self.write_header(complete=False)
+        self.metrics_file = open(os.path.join(run_dir, "metrics.bin"), "wb")
+        self.events_file = open(os.path.join(run_dir, "events.bin"), "wb")
+
+    def write_header(self, complete: bool) -> None:
+        """Writes the header with the configuration of the run and the dtypes of the binary files."""
+        header = {
+            "config": self.config,
+            "metrics_dtype": METRICS_DTYPE.descr,
+            "events_dtype": TRANSMISSION_DTYPE.descr,
+            "chunk_size": self.chunk_size,
+            "complete": complete,
+            "n_metrics": self.n_metrics,
+            "n_events": self.n_events,
+        }
+        header_path = os.path.join(self.run_dir, "header.json")
+        with open(header_path + ".tmp", "w") as header_file:
+            json.dump(header, header_file, indent=2)
+        os.replace(header_path + ".tmp", header_path)
+
+    def write_metrics(self, timestep: int, status_counts: np.ndarray) -> None:
+        """Appends the status counts of a timestep (the chunk is flushed to the disk when it is full)."""
+        self.metrics_buffer[self.n_buffered] = (timestep, *status_counts)
+        self.n_buffered += 1
+        self.n_metrics += 1
+        if self.n_buffered == self.chunk_size:
+            self.flush()
+
+    def write_events(self, events: np.ndarray) -> None:
+        """Appends transmission events (a structured array with the TRANSMISSION_DTYPE)."""
+        self.events_file.write(events.astype(TRANSMISSION_DTYPE, copy=False).tobytes())
+        self.n_events += len(events)
+
+    def flush(self) -> None:
+        """Writes the buffered metrics and all pending events to the disk."""
+        self.metrics_file.write(self.metrics_buffer[: self.n_buffered].tobytes())
+        self.n_buffered = 0
+        self.metrics_file.flush()
+        self.events_file.flush()
+
+    def __getstate__(self) -> Dict:
+        """
+        Returns the state of the writer for pickling a checkpoint (without the open files).
+        """
+        state = self.__dict__.copy()
+        del state["metrics_file"], state["events_file"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        """
+        Restores the writer from a checkpoint: the files are reopened for appending and truncated
+        to the rows that were written when the checkpoint was saved (rows of later timesteps are discarded).
+        """
+        self.__dict__.update(state)
+        self.metrics_file = self._reopen(
+            "metrics.bin", (self.n_metrics - self.n_buffered) * METRICS_DTYPE.itemsize
+        )
+        self.events_file = self._reopen(
+            "events.bin", self.n_events * TRANSMISSION_DTYPE.itemsize
+        )
+
+    def _reopen(self, file_name: str, size: int):
+        """Opens a binary file of the run, truncates it to the given size (in bytes) and moves to its end."""
+        binary_file = open(os.path.join(self.run_dir, file_name), "r+b")
+        binary_file.truncate(size)
+        binary_file.seek(size)
+        return binary_file
+
+    def reopen(self) -> None:
+        """
+        Reopens the files of a closed writer for appending (e.g. when a finished run is resumed)
+        and marks the run as incomplete again.
+        """
+        if not self.metrics_file.closed:
+            return
+        self.metrics_file = self._reopen("metrics.bin", self.n_metrics * METRICS_DTYPE.itemsize)
+        self.events_file = self._reopen("events.bin", self.n_events * TRANSMISSION_DTYPE.itemsize)
+        self.write_header(complete=False)
+
+    def close(self) -> None:
+        """Flushes all remaining data, closes the files and marks the run as complete."""
+        self.flush()
+        self.metrics_file.close()
+        self.events_file.close()
+        self.write_header(complete=True)
+
+
+def _map_rows(path: str, dtype: np.dtype) -> np.ndarray:
+    """Memory-maps all complete rows of a binary file (returns an empty array if there are none)."""
+    n_rows = os.path.getsize(path) // dtype.itemsize if os.path.isfile(path) else 0
+    if n_rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n_rows,))
+
+
+def open_run(run_dir: str) -> Tuple[Dict, np.ndarray, np.ndarray]:
+    """
+    Opens a run directory that was written by a TelemetryWriter (also while the run is still in progress).
+    Returns the header, the memory-mapped metrics (METRICS_DTYPE) and the memory-mapped events (TRANSMISSION_DTYPE).
+    """
+    with open(os.path.join(run_dir, "header.json")) as header_file:
+        header = json.load(header_file)
+    metrics = _map_rows(os.path.join(run_dir, "metrics.bin"), METRICS_DTYPE)
+    events = _map_rows(os.path.join(run_dir, "events.bin"), TRANSMISSION_DTYPE)
+    return header, metrics, events
@@ -0,0 +1,40 @@
+import json
+import pytest
+
+from benchmark import (
+    benchmark_steps,
+    benchmark_get_direction,
+    benchmark_collision_begin,
+    run_benchmarks,
+)
+
+
+def test_benchmark_steps(pathfinder):
+    result = benchmark_steps(pathfinder, n_people=50, n_steps=5, warmup_steps=2)
+    assert result["n_people"] == 50 and result["n_steps"] == 5
+    assert result["steps_per_s"] > 0
+    assert result["agent_steps_per_s"] == pytest.approx(result["steps_per_s"] * 50)
+
+
+def test_benchmark_get_direction(pathfinder):
+    result = benchmark_get_direction(pathfinder, n_queries=1_000)
+    assert result["n_single_calls"] == 100 and result["n_batched_queries"] == 1_000
+    assert result["single_calls_per_s"] > 0 and result["batched_queries_per_s"] > 0
+
+
+def test_benchmark_collision_begin(pathfinder):
+    result = benchmark_collision_begin(pathfinder, n_people=200, n_steps=20)
+    assert result["n_calls"] > 0
+    assert result["calls_per_step"] == result["n_calls"] / 20
+
+
+def test_run_benchmarks_writes_json(pathfinder, tmp_path):
+    output_path = tmp_path / "results.json"
+    results = run_benchmarks(
+        agent_counts=(50,), n_steps=5, n_heatmap_targets=1, output_path=str(output_path)
+    )
+    with open(output_path) as output_file:
+        saved = json.load(output_file)
+    assert saved == json.loads(json.dumps(results))
+    assert [result["n_people"] for result in saved["steps"]] == [50]
+    assert saved["create_heatmap"]["n_targets"] == 1
@@ -0,0 +1,27 @@
+import numpy as np
+
+from scheduler import EventScheduler, AliasTable
+
+
+def test_event_scheduler_pops_due_events_in_order():
+    scheduler = EventScheduler()
+    scheduler.schedule(np.array([5, 1, 3]), np.array([10, 11, 12]))
+    scheduler.schedule(np.array([2, 3]), np.array([13, 14]))
+
+    assert len(scheduler) == 5
+    assert scheduler.pop_due(0).tolist() == []
+    assert scheduler.pop_due(2).tolist() == [11, 13]
+    assert sorted(scheduler.pop_due(4).tolist()) == [12, 14]
+    assert scheduler.pop_due(100).tolist() == [10]
+    assert len(scheduler) == 0
+
+
+def test_alias_table_matches_the_weights():
+    np.random.seed(0)
+    weights = np.array([1.0, 0.0, 3.0, 0.5, 5.5])
+    table = AliasTable(weights)
+
+    samples = table.sample(2_000_000)
+    frequencies = np.bincount(samples, minlength=len(weights)) / len(samples)
+    np.testing.assert_allclose(frequencies, weights / weights.sum(), atol=2e-3)
+    assert frequencies[1] == 0  # outcomes without weight are never drawn
@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from simulator import CovidSim
+from seir import calibrate_transmission_rate, run_seir
+
+
+def test_run_seir_conserves_the_population():
+    counts = run_seir(0.02, 500, 100, 200, n_steps=2_000)
+    assert counts.shape == (2_000, 4)
+    np.testing.assert_allclose(counts.sum(axis=1), 500)
+    assert np.all(np.diff(counts[:, 0]) <= 0)  # nobody becomes susceptible again
+    assert np.all(np.diff(counts[:, 3]) >= 0)  # nobody recovers from being removed
+
+
+def test_run_seir_without_transmissions():
+    counts = run_seir(0.0, 100, 10, 20, n_steps=500, initial_counts=(90, 10, 0, 0))
+    assert counts[-1, 0] == 90
+    # the infected people only pass through the compartments with the average dwell times
+    np.testing.assert_allclose(counts[0], [90, 9, 1, 0])
+    assert counts[-1, 3] == pytest.approx(10, abs=1e-3)
+
+
+def test_run_seir_scenarios_match_single_runs():
+    rates = np.array([0.005, 0.01, 0.02])
+    scenarios = run_seir(rates, 500, [100], 200, n_steps=300)
+    assert scenarios.shape == (3, 300, 4)
+    for rate, counts in zip(rates, scenarios):
+        np.testing.assert_allclose(counts, run_seir(rate, 500, 100, 200, n_steps=300))
+
+
+def test_run_seir_rejects_dwell_times_below_one():
+    with pytest.raises(Exception):
+        run_seir(0.01, 100, 0, 10, n_steps=10)
+
+
+def test_calibrate_transmission_rate(pathfinder):
+    sim = CovidSim(500, 0.3, 20, 200, headless=True)
+    sim.pf = pathfinder
+    transmission_rate = calibrate_transmission_rate(sim, n_steps=600, speedup_factor=5)
+
+    # the rate is the number of transmissions per infectious-person-timestep (weighted by S/N)
+    susceptible, infectious = sim.status_counts[:, 0], sim.status_counts[:, 2]
+    n_transmissions = np.count_nonzero(sim.transmissions.events["infector"] >= 0)
+    assert transmission_rate > 0
+    assert transmission_rate == pytest.approx(
+        n_transmissions / np.sum(infectious * susceptible / 500)
+    )
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+from simulator import CovidSim
+
+
+def run_counts(sim: CovidSim, **run_kwargs):
+    """Runs the simulator with a fixed seed and returns the status counts and the transmission events."""
+    data = sim.run(seed=1, speedup_factor=5, max_timestep=300, return_data=True, **run_kwargs)
+    return np.stack(data[:4], axis=1).copy(), np.array(data[4])
+
+
+@pytest.mark.parametrize("physics_backend", ["pymunk", "numpy"])
+def test_checkpoints_dont_change_the_run(pathfinder, tmp_path, physics_backend):
+    sim = CovidSim(300, 0.3, 50, 100, headless=True, physics_backend=physics_backend)
+    sim.pf = pathfinder
+
+    counts, transmissions = run_counts(sim)
+    checkpointed_counts, checkpointed_transmissions = run_counts(
+        sim, checkpoint_path=str(tmp_path / "run.ckpt"), checkpoint_every=50
+    )
+    np.testing.assert_array_equal(counts, checkpointed_counts)
+    np.testing.assert_array_equal(transmissions, checkpointed_transmissions)
+
+
+def test_resume_numpy_backend_bit_for_bit(pathfinder, tmp_path):
+    sim = CovidSim(300, 0.3, 50, 100, headless=True, physics_backend="numpy")
+    sim.pf = pathfinder
+    counts, transmissions = run_counts(sim)
+
+    checkpoint_path = str(tmp_path / "run.ckpt")
+    sim.run(seed=1, speedup_factor=5, max_timestep=150, checkpoint_path=checkpoint_path, checkpoint_every=150)
+    resumed = CovidSim.load_checkpoint(checkpoint_path, pathfinder)
+    data = resumed.resume(return_data=True, max_timestep=300)
+    np.testing.assert_array_equal(counts, np.stack(data[:4], axis=1))
+    np.testing.assert_array_equal(transmissions, np.array(data[4]))
+
+
+def test_resume_a_finished_telemetry_run(pathfinder, tmp_path):
+    sim = CovidSim(300, 0.3, 50, 100, headless=True, physics_backend="numpy")
+    sim.pf = pathfinder
+    counts, _ = run_counts(sim)
+
+    sim.run(seed=1, speedup_factor=5, max_timestep=150, telemetry_dir=str(tmp_path))
+    data = sim.resume(return_data=True, max_timestep=300)
+    np.testing.assert_array_equal(counts, np.stack(data[:4], axis=1))
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from spatial_hash import SpatialHashGrid
+
+
+def brute_force_pairs(first_positions, second_positions, max_distance, unique_pairs):
+    """Returns all pairs of points that are at most max_distance apart by comparing all pairs."""
+    distances = np.linalg.norm(first_positions[:, None] - second_positions[None], axis=2)
+    close = distances <= max_distance
+    if unique_pairs:
+        close = np.triu(close, k=1)
+    return np.argwhere(close)
+
+
+@pytest.mark.parametrize("max_distance", [2.0, 4.0, 7.5])
+def test_query_pairs_matches_brute_force(max_distance):
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, 100, size=(500, 2))
+    grid = SpatialHashGrid(max_distance, 100, 100)
+    grid.build(positions)
+
+    pairs = grid.query_pairs(positions, max_distance)
+    np.testing.assert_array_equal(
+        pairs, brute_force_pairs(positions, positions, max_distance, unique_pairs=True)
+    )
+
+
+def test_query_pairs_with_points_outside_of_the_area():
+    positions = np.array([[-1.0, -1.0], [0.5, 0.5], [101.0, 50.0], [99.5, 50.0]])
+    grid = SpatialHashGrid(4, 100, 100)
+    grid.build(positions)
+    np.testing.assert_array_equal(grid.query_pairs(positions, 4), [[0, 1], [2, 3]])
+
+
+def test_query_neighbors_matches_brute_force():
+    rng = np.random.default_rng(1)
+    positions = rng.uniform(0, 100, size=(400, 2))
+    query_positions = rng.uniform(0, 100, size=(50, 2))
+    grid = SpatialHashGrid(10, 100, 100)
+    grid.build(positions)
+
+    pairs = grid.query_neighbors(query_positions, positions, 8)
+    np.testing.assert_array_equal(
+        pairs, brute_force_pairs(query_positions, positions, 8, unique_pairs=False)
+    )
+
+
+def test_max_distance_larger_than_cell_size():
+    grid = SpatialHashGrid(2, 10, 10)
+    grid.build(np.zeros((1, 2)))
+    with pytest.raises(Exception):
+        grid.query_pairs(np.zeros((1, 2)), 3)
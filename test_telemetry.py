@@ -0,0 +1,52 @@
+import pickle
+
+import numpy as np
+
+from telemetry import TelemetryWriter, open_run
+from transmission_log import TRANSMISSION_DTYPE
+
+
+def make_events(timesteps):
+    events = np.zeros(len(timesteps), dtype=TRANSMISSION_DTYPE)
+    events["timestep"] = timesteps
+    return events
+
+
+def test_written_rows_can_be_opened(tmp_path):
+    writer = TelemetryWriter(str(tmp_path), config={"seed": 1}, chunk_size=3)
+    for timestep in range(1, 8):
+        writer.write_metrics(timestep, np.array([10 - timestep, timestep, 0, 0]))
+    writer.write_events(make_events([2, 5]))
+    writer.close()
+
+    header, metrics, events = open_run(str(tmp_path))
+    assert header["complete"] and header["config"] == {"seed": 1}
+    assert metrics["timestep"].tolist() == list(range(1, 8))
+    assert metrics["infected"].tolist() == list(range(1, 8))
+    assert events["timestep"].tolist() == [2, 5]
+
+
+def test_restored_writer_discards_later_rows(tmp_path):
+    writer = TelemetryWriter(str(tmp_path), config={}, chunk_size=4)
+    for timestep in range(1, 6):
+        writer.write_metrics(timestep, np.zeros(4))
+    writer.write_events(make_events([3]))
+    writer.flush()
+    checkpoint = pickle.dumps(writer)
+
+    # rows that are written after the checkpoint
+    for timestep in range(6, 10):
+        writer.write_metrics(timestep, np.zeros(4))
+    writer.write_events(make_events([8]))
+    writer.flush()
+    writer.metrics_file.close()
+    writer.events_file.close()
+
+    restored = pickle.loads(checkpoint)
+    restored.write_metrics(6, np.ones(4))
+    restored.close()
+
+    _, metrics, events = open_run(str(tmp_path))
+    assert metrics["timestep"].tolist() == [1, 2, 3, 4, 5, 6]
+    assert metrics["susceptible"].tolist() == [0, 0, 0, 0, 0, 1]
+    assert events["timestep"].tolist() == [3]
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import numpy as np
+
+from typing import Tuple, List, Optional, Union
+
+
+# one row per transmission event (the infector is -1 for the initially infected people)
+TRANSMISSION_DTYPE = np.dtype(
+    [
+        ("timestep", np.int64),
+        ("infector", np.int32),
+        ("infectee", np.int32),
+        ("x", np.float32),
+        ("y", np.float32),
+    ]
+)
+
+
+class TransmissionLog:
+    """
+    A growable, columnar log of transmission events (timestep, infector id, infectee id, x, y)
+    that is stored in a numpy structured array and can be saved to the disk in bulk.
+    """
+
+    def __init__(self, initial_capacity: int = 1024) -> None:
+        self.buffer = np.zeros(initial_capacity, dtype=TRANSMISSION_DTYPE)
+        self.n_events = 0
+
+    def __len__(self) -> int:
+        return self.n_events
+
+    @property
+    def events(self) -> np.ndarray:
+        """Returns a view of all logged events (a structured array with the TRANSMISSION_DTYPE)."""
+        return self.buffer[: self.n_events]
+
+    def append(
+        self, timestep: int, infector: int, infectee: int, x: float, y: float
+    ) -> None:
+        """Logs a transmission event (the buffer doubles its capacity when it is full)."""
+        if self.n_events == len(self.buffer):
+            self.buffer = np.resize(self.buffer, 2 * len(self.buffer))
+        self.buffer[self.n_events] = (timestep, infector, infectee, x, y)
+        self.n_events += 1
+
+    def extend(
+        self,
+        timestep: int,
+        infectors: np.ndarray,
+        infectees: np.ndarray,
+        x: np.ndarray,
+        y: np.ndarray,
+    ) -> None:
+        """Logs several transmission events of the same timestep at once."""
+        n_new = len(infectees)
+        if self.n_events + n_new > len(self.buffer):
+            self.buffer = np.resize(
+                self.buffer, max(2 * len(self.buffer), self.n_events + n_new)
+            )
+        new_events = self.buffer[self.n_events : self.n_events + n_new]
+        new_events["timestep"] = timestep
+        new_events["infector"] = infectors
+        new_events["infectee"] = infectees
+        new_events["x"] = x
+        new_events["y"] = y
+        self.n_events += n_new
+
+    def clear(self) -> None:
+        """Removes all events (the capacity of the buffer is kept)."""
+        self.n_events = 0
+
+    def save(self, path: str) -> None:
+        """Saves all logged events as a numpy file."""
+        np.save(path, self.events)
+
+    @staticmethod
+    def load(path: str) -> np.ndarray:
+        """Loads the events from a numpy file that was saved with TransmissionLog.save."""
+        return np.load(path)
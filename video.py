@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import pygame as pg
+import os
+import queue
+import subprocess
+import threading
+
+from typing import Tuple, List, Optional, Union
+
+
+# file extensions that are encoded as a video by ffmpeg (every other path is used as a directory for an image sequence)
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".webm", ".avi", ".mov", ".gif")
+
+# seconds that a put waits for a free slot in the queue before it checks again whether the writer thread is alive
+QUEUE_TIMEOUT = 0.5
+
+
+class FrameWriter:
+    """
+    Exports rendered frames either to a video file (by streaming raw frames to an ffmpeg subprocess)
+    or to a numbered image sequence in a directory.
+    The frames are passed to a background thread through a bounded queue, so the simulation only
+    has to wait for the encoder if it falls behind by more than max_queued_frames frames.
+    """
+
+    def __init__(
+        self,
+        output_path: str,
+        frame_size: Tuple[int, int],
+        fps: int = 60,
+        max_queued_frames: int = 64,
+        ffmpeg_path: str = "ffmpeg",
+    ) -> None:
+        """
+        Starts the encoder (if the output is a video) and the background thread that writes the frames.
+        """
+        self.output_path = output_path
+        self.frame_size = frame_size
+        self.n_frames = 0
+        self.frame_queue = queue.Queue(maxsize=max_queued_frames)
+        self.encoder = None
+        self._error = None  # the exception that stopped the background thread (e.g. if the encoder exited)
+
+        if output_path.lower().endswith(VIDEO_EXTENSIONS):
+            # stream raw rgb frames to ffmpeg via its stdin
+            width, height = frame_size
+            command = [
+                ffmpeg_path,
+                "-y",
+                "-loglevel", "error",
+                "-f", "rawvideo",
+                "-pix_fmt", "rgb24",
+                "-s", f"{width}x{height}",
+                "-r", str(fps),
+                "-i", "-",
+            ]
+            if not output_path.lower().endswith(".gif"):
+                command += ["-pix_fmt", "yuv420p"]  # most video players only support this pixel format
+            command.append(output_path)
+            self.encoder = subprocess.Popen(command, stdin=subprocess.PIPE)
+        else:
+            # save the frames as numbered images
+            os.makedirs(output_path, exist_ok=True)
+
+        self.thread = threading.Thread(target=self._write_frames, daemon=True)
+        self.thread.start()
+
+    def write(self, surface: pg.Surface) -> None:
+        """
+        Copies the pixels of the given surface and enqueues them for writing
+        (blocks only if the queue is full). Raises the error of the background thread if it stopped.
+        """
+        frame = pg.image.tostring(surface, "RGB")
+        while True:
+            self._check_thread()
+            try:
+                self.frame_queue.put(frame, timeout=QUEUE_TIMEOUT)
+                break
+            except queue.Full:
+                continue  # check again whether the thread is still writing
+        self.n_frames += 1
+
+    def _check_thread(self) -> None:
+        """Raises the error that stopped the background thread (or an exception if the thread isn't running)."""
+        if self._error is not None:
+            raise self._error
+        if not self.thread.is_alive():
+            raise Exception(f"The frame writer for '{self.output_path}' is closed.")
+
+    def _write_frames(self) -> None:
+        """
+        Writes the enqueued frames until the end of the stream (None) is reached.
+        An error (e.g. a BrokenPipeError if the encoder exited) stops the thread and is saved in self._error.
+        """
+        frame_index = 0
+        try:
+            while True:
+                frame = self.frame_queue.get()
+                if frame is None:
+                    break
+                if self.encoder is not None:
+                    self.encoder.stdin.write(frame)
+                else:
+                    image = pg.image.fromstring(frame, self.frame_size, "RGB")
+                    pg.image.save(
+                        image, os.path.join(self.output_path, f"frame_{frame_index:06d}.png")
+                    )
+                frame_index += 1
+        except Exception as error:
+            self._error = error
+
+    def close(self) -> None:
+        """
+        Writes all remaining frames and finishes the video (or image sequence).
+        Raises the error of the background thread if it stopped before all frames were written.
+        """
+        while self.thread.is_alive():
+            try:
+                self.frame_queue.put(None, timeout=QUEUE_TIMEOUT)
+                break
+            except queue.Full:
+                continue
+        self.thread.join()
+        if self.encoder is not None:
+            try:
+                self.encoder.stdin.close()
+            except BrokenPipeError:
+                pass  # the encoder already exited (its error is raised below)
+            self.encoder.wait()
+        if self._error is not None:
+            raise self._error
+        print(f"saved {self.n_frames} frames to '{self.output_path}'")
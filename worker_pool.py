@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import os
+
+from simulator import CovidSim
+from pathfinding import Pathfinder
+from shared_fields import SharedFields
+
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Tuple, List, Optional, Union, Dict, Iterator
+
+
+# simulator of the current worker process (created once per worker by init_worker)
+_worker_sim = None
+
+
+def init_worker(sim_kwargs: Dict, shared_fields: SharedFields) -> None:
+    """
+    Creates a headless simulator once per worker process and attaches its pathfinder to the shared
+    pathfinding fields of the parent process, so that no worker loads its own copy of them.
+    (The pymunk world is still built at the start of every run: it only takes a few milliseconds,
+    and a reused space gives different results for the same seed.)
+    """
+    global _worker_sim
+    _worker_sim = CovidSim(**sim_kwargs, headless=True)
+    Pathfinder.attach_shared(_worker_sim, shared_fields)
+
+
+def get_worker_sim() -> CovidSim:
+    """Returns the simulator of the current worker process."""
+    return _worker_sim
+
+
+def check_sim_kwargs(sim_kwargs: Dict) -> None:
+    """Raises an exception if the simulator parameters of a pool contain headless (the workers always run headless)."""
+    if "headless" in sim_kwargs:
+        raise Exception(
+            "Value Error: The simulations of a worker pool always run headless (remove 'headless' from sim_kwargs)."
+        )
+
+
+@contextmanager
+def simulation_pool(
+    sim_kwargs: Dict,
+    n_workers: Optional[int] = None,
+    use_precomputed_heatmaps: bool = True,
+) -> Iterator[ProcessPoolExecutor]:
+    """
+    Starts a pool of n_workers processes (default: one per CPU core) that each hold a headless simulator
+    with the given sim_kwargs (see get_worker_sim). The pathfinding fields are loaded (or computed) once in this
+    process and shared with the workers, and the shared memory is released when the pool is closed.
+    (When this is called from a script, the call has to be guarded by `if __name__ == "__main__":`.)
+    """
+    check_sim_kwargs(sim_kwargs)
+    pathfinder = Pathfinder(
+        CovidSim(**sim_kwargs, headless=True),
+        use_precomputed_heatmaps=use_precomputed_heatmaps,
+    )
+    with pathfinder.share() as shared_fields, ProcessPoolExecutor(
+        max_workers=n_workers or os.cpu_count() or 1,
+        initializer=init_worker,
+        initargs=(sim_kwargs, shared_fields),
+    ) as executor:
+        yield executor